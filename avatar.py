@@ -0,0 +1,149 @@
+from PIL import Image, ImageDraw
+from functools import lru_cache
+import colorsys
+import io
+
+# Avatar preprocessing for the welcome card. The downloaded avatar is decoded
+# once, scaled down once, and turned into the two ready-to-paste sprites the
+# card uses; all masks and borders only depend on the size and are built once
+# per process.
+
+# Avatar sizes on the card: the glowing one behind and the ringed one on top
+GLOW_AVATAR_SIZE = 150
+FRAMED_AVATAR_SIZE = 180
+
+
+class PreparedAvatar:
+    """The two avatar sprites pasted onto the card (both RGBA)"""
+
+    def __init__(self, glow, framed):
+        self.glow = glow
+        self.framed = framed
+
+
+def decode_first_frame(data, target_size):
+    """Decode avatar bytes as cheaply as possible into an RGBA image
+
+    JPEGs are decoded straight at a reduced scale via draft(), big images are
+    box-reduced before any resampling, and for animated GIF/WebP avatars only
+    the first frame is ever decoded.
+    """
+    avatar = Image.open(io.BytesIO(data))
+    if avatar.format == 'JPEG':
+        avatar.draft('RGB', (target_size, target_size))
+
+    # convert() decodes just the current (first) frame and makes the mode explicit
+    avatar = avatar.convert('RGBA')
+
+    factor = min(avatar.size) // target_size
+    if factor >= 2:
+        avatar = avatar.reduce(factor)
+    return avatar
+
+
+@lru_cache(maxsize=None)
+def circle_mask(size):
+    """Opaque disc mask"""
+    mask = Image.new('L', (size, size), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, size, size), fill=255)
+    return mask
+
+
+@lru_cache(maxsize=None)
+def glow_mask(avatar_size):
+    """Disc mask with soft glow rings around it (avatar_size + 20 square)"""
+    mask_size = avatar_size + 20
+    mask = Image.new('L', (mask_size, mask_size), 0)
+    mask_draw = ImageDraw.Draw(mask)
+
+    # Multiple circles for glow effect
+    for i in range(10, 0, -1):
+        alpha = int(255 * (1 - i / 10) * 0.3)
+        circle_size = avatar_size + i * 2
+        x_offset = (mask_size - circle_size) // 2
+        mask_draw.ellipse([x_offset, x_offset,
+                         x_offset + circle_size, x_offset + circle_size],
+                        fill=alpha)
+
+    # Main avatar circle
+    center = mask_size // 2
+    mask_draw.ellipse([center - avatar_size//2, center - avatar_size//2,
+                     center + avatar_size//2, center + avatar_size//2],
+                    fill=255)
+    return mask
+
+
+@lru_cache(maxsize=None)
+def rainbow_border(avatar_size):
+    """Rainbow glow border drawn behind the glowing avatar"""
+    mask_size = avatar_size + 20
+    center = mask_size // 2
+    border = Image.new('RGBA', (mask_size, mask_size), (0, 0, 0, 0))
+    glow_draw = ImageDraw.Draw(border)
+    for i in range(8):
+        hue = i / 8
+        rgb = colorsys.hls_to_rgb(hue, 0.5, 1.0)
+        color = tuple(int(c * 255) for c in rgb) + (100,)
+
+        border_thickness = 8 - i
+        glow_draw.ellipse([center - avatar_size//2 - border_thickness,
+                         center - avatar_size//2 - border_thickness,
+                         center + avatar_size//2 + border_thickness,
+                         center + avatar_size//2 + border_thickness],
+                        outline=color, width=2)
+    return border
+
+
+@lru_cache(maxsize=None)
+def ring_border(avatar_size):
+    """Magenta/cyan/yellow/white rings around the framed avatar"""
+    border_size = avatar_size + 40
+    border = Image.new('RGBA', (border_size, border_size), (0, 0, 0, 0))
+    border_draw = ImageDraw.Draw(border)
+
+    ring_colors = [
+        (255, 0, 255, 200),   # Magenta
+        (0, 255, 255, 180),   # Cyan
+        (255, 255, 0, 160),   # Yellow
+        (255, 255, 255, 220)  # White
+    ]
+
+    center = border_size // 2
+    for i, color in enumerate(ring_colors):
+        ring_radius = avatar_size // 2 + 10 + (i * 5)
+        border_draw.ellipse([center - ring_radius, center - ring_radius,
+                           center + ring_radius, center + ring_radius],
+                          outline=color, width=3)
+    return border
+
+
+def glow_sprite(avatar):
+    """Avatar (already GLOW_AVATAR_SIZE) in a glowing circle over the rainbow border"""
+    avatar_size = avatar.width
+    mask = glow_mask(avatar_size)
+    cutout = Image.new('RGBA', mask.size, (0, 0, 0, 0))
+    offset = (mask.width - avatar_size) // 2
+    cutout.paste(avatar, (offset, offset))
+    cutout.putalpha(mask)
+    return Image.alpha_composite(rainbow_border(avatar_size), cutout)
+
+
+def framed_sprite(avatar):
+    """Avatar (already FRAMED_AVATAR_SIZE) cut into a circle inside the rings"""
+    avatar_size = avatar.width
+    circular = avatar.copy()
+    circular.putalpha(circle_mask(avatar_size))
+
+    border = ring_border(avatar_size).copy()
+    offset = (border.width - avatar_size) // 2
+    border.paste(circular, (offset, offset), circular)
+    return border
+
+
+def prepare_avatar(data):
+    """Decode avatar bytes once and build both card sprites from one downscale"""
+    avatar = decode_first_frame(data, FRAMED_AVATAR_SIZE)
+    framed = avatar.resize((FRAMED_AVATAR_SIZE, FRAMED_AVATAR_SIZE), Image.Resampling.LANCZOS)
+    # The smaller copy comes from the already downscaled one, not the original
+    glow = framed.resize((GLOW_AVATAR_SIZE, GLOW_AVATAR_SIZE), Image.Resampling.LANCZOS)
+    return PreparedAvatar(glow_sprite(glow), framed_sprite(framed))
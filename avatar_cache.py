@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from metrics import metrics
+
+# Avatar cache settings. An entry is the raw 256px download (up to ~200 KB)
+# plus its two RGBA sprites (~310 KB), so ~0.5 MB; AVATAR_CACHE_MB caps the
+# total and AVATAR_CACHE_SIZE the count, whichever is hit first.
+AVATAR_CACHE_SIZE = int(os.environ.get('AVATAR_CACHE_SIZE', 512))
+AVATAR_CACHE_MB = float(os.environ.get('AVATAR_CACHE_MB', 48))
+AVATAR_CACHE_TTL = float(os.environ.get('AVATAR_CACHE_TTL', 3600))
+
+# Discord serves any power of two; the card never draws the avatar above 180px
+AVATAR_FETCH_SIZE = 256
+
+
+class CachedAvatar:
+    """Downloaded avatar bytes plus the decoded image the renderer uses"""
+
+    def __init__(self, data, image):
+        self.data = data
+        self.image = image
+        self.fetched_at = time.monotonic()
+        self.size = len(data) + image_bytes(image)
+
+
+def image_bytes(image):
+    """Pixel bytes held by a PreparedAvatar (0 for None)"""
+    if image is None:
+        return 0
+    return sum(sprite.width * sprite.height * len(sprite.getbands())
+               for sprite in (image.glow, image.framed))
+
+
+class AvatarCache:
+    """In-memory LRU avatar cache keyed by avatar hash
+
+    Entries expire after `ttl` seconds, the cache never holds more than
+    `max_entries` or `max_bytes` (raw bytes plus sprite pixels), and concurrent requests for the same avatar share a single
+    download (rejoin spam and raids tend to repeat the same few avatars).
+    """
+
+    def __init__(self, max_entries=AVATAR_CACHE_SIZE, ttl=AVATAR_CACHE_TTL, decode=None,
+                 max_bytes=int(AVATAR_CACHE_MB * 1024 * 1024)):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.ttl = ttl
+        # Optional coroutine function turning bytes into the cached image
+        self.decode = decode
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.fetched_at > self.ttl:
+            self.bytes -= self.entries.pop(key).size
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key, entry):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old.size
+        self.entries[key] = entry
+        self.bytes += entry.size
+        # The newest entry always stays, even if it alone is over the byte cap
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries
+                                         or self.bytes > self.max_bytes):
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= evicted.size
+
+    async def get(self, session, key, url):
+        """Return the CachedAvatar for `key`, downloading it from `url` if needed"""
+        entry = self.lookup(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        # Someone is already fetching this avatar: wait for their result
+        task = self.inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        task = asyncio.ensure_future(self._fetch(session, key, url))
+        self.inflight[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self.inflight.pop(key, None)
+            else:
+                # We were cancelled but the shared fetch is still running
+                task.add_done_callback(lambda _: self.inflight.pop(key, None))
+
+    async def _fetch(self, session, key, url):
+        with metrics.time('avatar_fetch'):
+            async with session.get(url) as resp:
+                if resp.status != 200:
+                    return None
+                data = await resp.read()
+
+        image = await self.decode(data) if self.decode else None
+        entry = CachedAvatar(data, image)
+        self.store(key, entry)
+        return entry
@@ -0,0 +1,221 @@
+"""Offline batch renderer for backfills, theme previews and stress tests
+
+Reads member records as JSON lines and renders their welcome cards on a
+process pool using every core, writing each card as soon as it's done to a
+directory or a tar file (.tar, .tar.gz). Only a small window of records is in
+flight at a time, so memory stays flat however long the input is.
+
+    python batch_render.py members.jsonl --output cards/
+    python batch_render.py members.jsonl --output cards.tar.gz --theme sunset
+
+One record per line; only "name" is required:
+
+    {"name": "Surfer", "avatar": "avatars/1.png", "count": 1234}
+    {"name": "Rider", "avatar": "https://cdn.example/a.png", "count": 1235,
+     "id": 42, "theme": "default", "tier": "reduced", "file": "rider"}
+
+"avatar" is a local path or an http(s) URL, "id" seeds the background pick
+(defaults to the line number), "file" names the output instead of "name"
+(without extension; reduced to letters, digits, '_' and '-'). Every output
+is prefixed with its line number, so names never collide.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import re
+import sys
+import tarfile
+import time
+
+import aiohttp
+
+from avatar_cache import AvatarCache, CachedAvatar
+from quality import TIERS, FULL
+from render import RenderService
+from theme import THEME_DIR, load_theme
+
+
+class CardWriter:
+    """Writes finished cards into a directory or a streamed tar file"""
+
+    def __init__(self, output):
+        self.count = 0
+        self.bytes = 0
+        self.tar = None
+        if output.endswith(('.tar', '.tar.gz', '.tgz')):
+            mode = 'w|' if output.endswith('.tar') else 'w|gz'
+            self.tar = tarfile.open(output, mode)
+        else:
+            os.makedirs(output, exist_ok=True)
+        self.output = output
+
+    def write(self, name, data):
+        if self.tar is not None:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.tar.addfile(info, io.BytesIO(data))
+        else:
+            with open(os.path.join(self.output, name), 'wb') as f:
+                f.write(data)
+        self.count += 1
+        self.bytes += len(data)
+
+    def close(self):
+        if self.tar is not None:
+            self.tar.close()
+
+
+class Themes:
+    """Themes by name (from THEME_DIR) or by path to a JSON file, loaded once each"""
+
+    def __init__(self):
+        self.loaded = {}
+
+    def get(self, name):
+        if name is None:
+            return None
+        if name not in self.loaded:
+            path = name if name.endswith('.json') else os.path.join(THEME_DIR, f'{name}.json')
+            self.loaded[name] = load_theme(path)
+        return self.loaded[name]
+
+
+def safe_stem(text):
+    """Letters, digits, '_' and '-' only, so a name can't leave the output"""
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', str(text)).strip('_')[:40]
+
+
+def output_name(index, record, extension):
+    # The line index keeps names unique without remembering the ones written
+    stem = safe_stem(record.get('file') or '') or safe_stem(record['name'])
+    return f"{index:06d}_{stem}.{extension}" if stem else f"{index:06d}.{extension}"
+
+
+async def load_avatar(source, session, avatar_cache, render_service):
+    """PreparedAvatar for a local path or URL (cached), or None"""
+    if not source:
+        return None
+    if source.startswith(('http://', 'https://')):
+        entry = await avatar_cache.get(session, source, source)
+        return entry.image if entry else None
+
+    entry = avatar_cache.lookup(source)
+    if entry is None:
+        data = await asyncio.to_thread(read_file, source)
+        entry = CachedAvatar(data, await render_service.prepare_avatar(data))
+        avatar_cache.store(source, entry)
+    return entry.image
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+async def render_record(index, record, args, session, avatar_cache, render_service, themes):
+    tier = record.get('tier', args.tier)
+    if tier not in TIERS:
+        raise ValueError(f"Unknown tier '{tier}'")
+    avatar = await load_avatar(record.get('avatar'), session, avatar_cache, render_service)
+    card = await render_service.render(
+        str(record['name']), int(record.get('count', index + 1)), avatar,
+        tier, int(record.get('id', index)),
+        themes.get(record.get('theme', args.theme)))
+    return output_name(index, record, card.extension), card.data
+
+
+def read_records(stream):
+    """(line index, text) for every non-blank line"""
+    for index, line in enumerate(stream):
+        line = line.strip()
+        if line:
+            yield index, line
+
+
+async def main(args):
+    workers = args.workers or os.cpu_count() or 1
+    window = args.window or workers * 2
+    render_service = RenderService(workers=workers, timeout=args.timeout)
+    await render_service.start()
+
+    avatar_cache = AvatarCache(max_entries=args.avatar_cache, decode=render_service.prepare_avatar)
+    themes = Themes()
+    writer = CardWriter(args.output)
+    failures = 0
+    started = time.perf_counter()
+
+    # task -> record line index
+    pending = {}
+
+    def finish(done):
+        nonlocal failures
+        for task in done:
+            index = pending.pop(task)
+            try:
+                name, data = task.result()
+            except Exception as e:
+                failures += 1
+                print(f"Record {index + 1} failed: {e!r}", file=sys.stderr)
+                continue
+            writer.write(name, data)
+
+    stream = sys.stdin if args.input == '-' else open(args.input)
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+            for index, line in read_records(stream):
+                if len(pending) >= window:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    finish(done)
+                try:
+                    record = json.loads(line)
+                    if not isinstance(record, dict) or 'name' not in record:
+                        raise ValueError('a record needs a "name"')
+                except ValueError as e:
+                    failures += 1
+                    print(f"Record {index + 1} is invalid: {e!r}", file=sys.stderr)
+                    continue
+                task = asyncio.create_task(render_record(index, record, args, session,
+                                                         avatar_cache, render_service, themes))
+                pending[task] = index
+            if pending:
+                done, _ = await asyncio.wait(pending)
+                finish(done)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        writer.close()
+        render_service.shutdown(wait=True)
+
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        'rendered': writer.count,
+        'failed': failures,
+        'seconds': round(elapsed, 2),
+        'cards_per_second': round(writer.count / elapsed, 2) if elapsed else None,
+        'bytes': writer.bytes,
+        'workers': workers,
+        'output': args.output,
+    }, indent=2))
+    return 1 if failures else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('input', help="JSONL member records ('-' for stdin)")
+    parser.add_argument('--output', required=True,
+                        help='directory, or a .tar / .tar.gz file to stream the cards into')
+    parser.add_argument('--workers', type=int, default=0, help='render processes (default: all cores)')
+    parser.add_argument('--window', type=int, default=0,
+                        help='records in flight at once (default: twice the workers)')
+    parser.add_argument('--timeout', type=float, default=60, help='per-render timeout (s)')
+    parser.add_argument('--avatar-cache', type=int, default=64, help='prepared avatars kept in memory')
+    parser.add_argument('--theme', help='theme name or path to a theme JSON (default: the default theme)')
+    parser.add_argument('--tier', choices=TIERS, default=FULL, help='quality tier to render at')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,214 @@
+"""Offline benchmark for the welcome-card pipeline
+
+Runs the same avatar fetch -> avatar prep -> render -> encode path the bot
+uses, but against stand-in members and a local aiohttp server that serves
+generated avatars, so no Discord connection is needed. Prints (or writes) a
+JSON report with latency percentiles, throughput, peak RSS and a per-stage
+breakdown for a serial and a concurrent run.
+
+    python bench.py --renders 50 --concurrency 8 --workers 4 --output bench.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import resource
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+from PIL import Image
+
+from avatar_cache import AvatarCache, AVATAR_FETCH_SIZE
+from quality import TIERS, FULL, percentile
+from render import RenderService
+
+
+class FakeAsset:
+    """Just enough of discord.Asset for the render path"""
+
+    def __init__(self, base_url, key, size=1024):
+        self.base_url = base_url
+        self.key = key
+        self.size = size
+
+    @property
+    def url(self):
+        return f"{self.base_url}/avatars/{self.key}.png?size={self.size}"
+
+    def with_size(self, size):
+        return FakeAsset(self.base_url, self.key, size)
+
+
+class FakeGuild:
+    def __init__(self, member_count):
+        self.id = 1
+        self.members = [None] * member_count
+        self.member_count = member_count
+
+
+class FakeMember:
+    def __init__(self, display_name, display_avatar, guild):
+        self.id = random.getrandbits(63)
+        self.display_name = display_name
+        self.display_avatar = display_avatar
+        self.guild = guild
+        self.mention = f"<@{self.id}>"
+
+
+def make_avatar(seed, size=512):
+    """A deterministic, not-too-compressible avatar image as PNG bytes"""
+    rng = random.Random(seed)
+    img = Image.effect_noise((size, size), 40).convert('RGB')
+    tint = Image.new('RGB', (size, size), tuple(rng.randint(0, 255) for _ in range(3)))
+    img = Image.blend(img, tint, 0.6)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+async def start_avatar_server(avatar_count, latency):
+    """Serve `avatar_count` generated avatars on a random local port"""
+    avatars = {str(i): make_avatar(i) for i in range(avatar_count)}
+
+    async def avatar(request):
+        data = avatars.get(request.match_info['key'])
+        if data is None:
+            raise web.HTTPNotFound()
+        if latency:
+            await asyncio.sleep(latency)
+        return web.Response(body=data, content_type='image/png')
+
+    app = web.Application()
+    app.router.add_get('/avatars/{key}.png', avatar)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def render_member(member, session, avatar_cache, render_service, tier):
+    """One join through the bot's render path, timed per stage"""
+    stages = {}
+    started = time.perf_counter()
+
+    asset = member.display_avatar
+    entry = await avatar_cache.get(session, asset.key, str(asset.with_size(AVATAR_FETCH_SIZE).url))
+    stages['avatar'] = time.perf_counter() - started
+
+    render_started = time.perf_counter()
+    card = await render_service.render(member.display_name, len(member.guild.members),
+                                       entry.image if entry else None, tier)
+    stages['render'] = time.perf_counter() - render_started
+    # Breakdown measured inside the worker (background, avatar, text, encode, ...)
+    for stage, seconds in card.stages.items():
+        stages[f'render.{stage}'] = seconds
+
+    return time.perf_counter() - started, stages, len(card.data)
+
+
+def summarize(latencies, stage_samples, sizes, elapsed):
+    report = {
+        'renders': len(latencies),
+        'seconds': round(elapsed, 4),
+        'throughput_per_s': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'latency_ms': {f'p{q}': round(percentile(latencies, q) * 1000, 2) for q in (50, 95, 99)},
+        'mean_bytes': int(sum(sizes) / len(sizes)),
+        'stages_ms': {},
+    }
+    for stage, samples in stage_samples.items():
+        report['stages_ms'][stage] = {
+            'mean': round(sum(samples) / len(samples) * 1000, 2),
+            'p95': round(percentile(samples, 95) * 1000, 2),
+        }
+    return report
+
+
+async def run_mode(members, concurrency, session, avatar_cache, render_service, tier):
+    latencies, sizes, stage_samples = [], [], {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(member):
+        async with semaphore:
+            latency, stages, size = await render_member(member, session, avatar_cache,
+                                                        render_service, tier)
+        latencies.append(latency)
+        sizes.append(size)
+        for stage, seconds in stages.items():
+            stage_samples.setdefault(stage, []).append(seconds)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(member) for member in members])
+    return summarize(latencies, stage_samples, sizes, time.perf_counter() - started)
+
+
+def peak_rss_mb():
+    """Peak RSS of this process and of the (reaped) render workers, in MB"""
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {'main': round(own / scale, 1), 'workers_max': round(children / scale, 1)}
+
+
+async def main(args):
+    random.seed(args.seed)
+    unique = args.unique_avatars or args.renders
+    runner, base_url = await start_avatar_server(unique, args.latency)
+
+    render_service = RenderService(workers=args.workers, timeout=args.timeout)
+    await render_service.start()
+
+    guild = FakeGuild(args.member_count)
+    members = [FakeMember(f"Surfer{i}", FakeAsset(base_url, str(i % unique)), guild)
+               for i in range(args.renders)]
+
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'modes': {},
+    }
+    try:
+        async with aiohttp.ClientSession() as session:
+            for mode, concurrency in (('serial', 1), ('concurrent', args.concurrency)):
+                # Fresh avatar cache per mode so both pay the same fetch/prep cost
+                avatar_cache = AvatarCache(decode=render_service.prepare_avatar)
+                report['modes'][mode] = await run_mode(members, concurrency, session,
+                                                       avatar_cache, render_service, args.tier)
+                report['modes'][mode]['avatar_cache'] = {
+                    'hits': avatar_cache.hits, 'misses': avatar_cache.misses,
+                    'coalesced': avatar_cache.coalesced,
+                }
+    finally:
+        # Wait for the workers to exit so their peak RSS shows up in RUSAGE_CHILDREN
+        render_service.shutdown(wait=True)
+        await runner.cleanup()
+
+    report['peak_rss_mb'] = peak_rss_mb()
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--renders', type=int, default=50, help='renders per mode')
+    parser.add_argument('--concurrency', type=int, default=8, help='in-flight renders in concurrent mode')
+    parser.add_argument('--workers', type=int, default=2, help='render pool size')
+    parser.add_argument('--timeout', type=float, default=60, help='per-render timeout (s)')
+    parser.add_argument('--unique-avatars', type=int, default=0,
+                        help='distinct avatars (default: one per render, i.e. no cache hits)')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated avatar CDN latency (s)')
+    parser.add_argument('--member-count', type=int, default=1000, help='size of the fake guild')
+    parser.add_argument('--tier', choices=TIERS, default=FULL, help='quality tier to render at')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
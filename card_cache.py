@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from encoder import EncodedImage, EXTENSIONS
+
+# Encoded-card cache settings. The memory tier holds CARD_CACHE_SIZE cards;
+# the disk tier is off unless CARD_CACHE_DIR is set and is capped in MB.
+CARD_CACHE_SIZE = int(os.environ.get('CARD_CACHE_SIZE', 128))
+CARD_CACHE_DIR = os.environ.get('CARD_CACHE_DIR', '')
+CARD_CACHE_DISK_MB = float(os.environ.get('CARD_CACHE_DISK_MB', 256))
+
+FORMATS = {extension: fmt for fmt, extension in EXTENSIONS.items()}
+
+
+def card_key(avatar_key, display_name, member_count, theme, tier, fmt):
+    """Content address of a card: a digest of everything that changes its pixels"""
+    raw = '\x1f'.join(str(part) for part in (avatar_key, display_name, member_count, theme, tier, fmt))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class CardCache:
+    """Two-level LRU cache of encoded cards (rejoins and send retries)
+
+    Memory holds the most recent `max_entries` cards. With a `directory`,
+    cards are also written there as <key>.<ext> and the oldest files are
+    deleted once the directory passes `max_disk_bytes`; the disk index is
+    rebuilt from file mtimes at startup, so it survives restarts. Disk I/O
+    runs in a thread to keep the event loop free.
+    """
+
+    def __init__(self, max_entries=CARD_CACHE_SIZE, directory=CARD_CACHE_DIR,
+                 max_disk_bytes=int(CARD_CACHE_DISK_MB * 1024 * 1024)):
+        self.max_entries = max_entries
+        self.directory = directory or None
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        # key -> (filename, size), oldest first
+        self.files = OrderedDict()
+        self.disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.directory:
+            self.scan()
+
+    def scan(self):
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            key, _, extension = entry.name.partition('.')
+            if entry.is_file() and extension in FORMATS:
+                stat = entry.stat()
+                found.append((stat.st_mtime, key, entry.name, stat.st_size))
+        for _, key, name, size in sorted(found):
+            self.files[key] = (name, size)
+            self.disk_bytes += size
+        self.evict_files()
+
+    async def get(self, key):
+        card = self.entries.get(key)
+        if card is not None:
+            self.entries.move_to_end(key)
+            self.memory_hits += 1
+            return card
+
+        if key in self.files:
+            name, _ = self.files[key]
+            card = await asyncio.to_thread(self.read_file, name)
+            if card is not None:
+                self.files.move_to_end(key)
+                self.disk_hits += 1
+                self.remember(key, card)
+                return card
+            self.forget_file(key)
+
+        self.misses += 1
+        return None
+
+    async def put(self, key, card):
+        self.remember(key, card)
+        if self.directory and key not in self.files:
+            name = f'{key}.{card.extension}'
+            try:
+                await asyncio.to_thread(self.write_file, name, card.data)
+            except OSError as e:
+                print(f"Couldn't write card cache file {name}: {e}")
+                return
+            self.files[key] = (name, len(card.data))
+            self.disk_bytes += len(card.data)
+            self.evict_files()
+
+    def remember(self, key, card):
+        self.entries[key] = card
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def read_file(self, name):
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Refresh the mtime so the LRU order survives a restart
+            os.utime(path)
+        except OSError:
+            return None
+        fmt = FORMATS[name.partition('.')[2]]
+        return EncodedImage(data, fmt, settings={}, seconds=0.0)
+
+    def write_file(self, name, data):
+        path = os.path.join(self.directory, name)
+        temp = f'{path}.tmp'
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, path)
+
+    def forget_file(self, key):
+        name, size = self.files.pop(key)
+        self.disk_bytes -= size
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    def evict_files(self):
+        while self.files and self.disk_bytes > self.max_disk_bytes:
+            self.forget_file(next(iter(self.files)))
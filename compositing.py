@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+from PIL import Image, ImageDraw
+
+# Small compositing layer for the card renderer. Effects are blended into one
+# persistent RGBA working canvas, and only over the rectangle they actually
+# cover, instead of allocating a full-canvas overlay per shape.
+
+
+def _union(boxes):
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def _points_bbox(points, pad=0):
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return (min(xs) - pad, min(ys) - pad, max(xs) + pad + 1, max(ys) + pad + 1)
+
+
+class Canvas:
+    """Persistent RGBA working canvas with dirty-rectangle compositing"""
+
+    def __init__(self, image):
+        self.image = image if image.mode == 'RGBA' else image.convert('RGBA')
+        self.draw = ImageDraw.Draw(self.image)
+
+    @property
+    def size(self):
+        return self.image.size
+
+    def clip(self, bbox):
+        """Clamp a bbox to the canvas; None if nothing is left"""
+        x0, y0, x1, y1 = (int(v) for v in bbox)
+        width, height = self.image.size
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, width), min(y1, height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+    def composite_shape(self, shape, bbox):
+        """Alpha-composite an RGBA `shape` whose top-left sits at bbox[:2]
+
+        Only the part of the canvas under the (clipped) bbox is touched.
+        """
+        clipped = self.clip(bbox)
+        if clipped is None:
+            return
+        x0, y0, x1, y1 = clipped
+        sx, sy = x0 - int(bbox[0]), y0 - int(bbox[1])
+        self.image.alpha_composite(shape, (x0, y0), (sx, sy, sx + x1 - x0, sy + y1 - y0))
+
+    def paste(self, image, xy):
+        """Composite an RGBA image (e.g. the framed avatar) at xy"""
+        self.composite_shape(image, (xy[0], xy[1], xy[0] + image.width, xy[1] + image.height))
+
+    @contextmanager
+    def batch(self):
+        """Collect translucent shapes and flush them as one overlay per alpha level"""
+        shapes = ShapeBatch()
+        yield shapes
+        shapes.flush(self)
+
+    def to_rgb(self):
+        return self.image.convert('RGB')
+
+
+class ShapeBatch:
+    """Shapes queued for Canvas.batch(), grouped by their fill alpha"""
+
+    def __init__(self):
+        self.groups = {}
+
+    def _add(self, alpha, bbox, op, *args, **kwargs):
+        self.groups.setdefault(alpha, []).append((bbox, op, args, kwargs))
+
+    def ellipse(self, box, fill):
+        self._add(fill[3], _points_bbox([box[:2], box[2:]]), 'ellipse', box, fill=fill)
+
+    def polygon(self, points, fill=None, outline=None, width=1):
+        color = fill or outline
+        self._add(color[3], _points_bbox(points, pad=width), 'polygon', points,
+                  fill=fill, outline=outline, width=width)
+
+    def flush(self, canvas):
+        for alpha, shapes in self.groups.items():
+            bbox = canvas.clip(_union([s[0] for s in shapes]))
+            if bbox is None:
+                continue
+            x0, y0, x1, y1 = bbox
+            overlay = Image.new('RGBA', (x1 - x0, y1 - y0), (0, 0, 0, 0))
+            overlay_draw = ImageDraw.Draw(overlay)
+            for _, op, args, kwargs in shapes:
+                # Shift shape coordinates into the overlay's local space
+                if op == 'ellipse':
+                    bx0, by0, bx1, by1 = args[0]
+                    overlay_draw.ellipse([bx0 - x0, by0 - y0, bx1 - x0, by1 - y0], **kwargs)
+                elif op == 'polygon':
+                    overlay_draw.polygon([(px - x0, py - y0) for px, py in args[0]], **kwargs)
+            canvas.composite_shape(overlay, bbox)
+        self.groups = {}
@@ -0,0 +1,92 @@
+import io
+import multiprocessing
+import os
+import time
+
+# Output encoding for finished cards. PNG stays lossless but uses a cheaper
+# zlib level than Pillow's default; WebP and JPEG trade a little fidelity for
+# much smaller uploads. An optional byte budget walks a ladder of settings
+# from cheapest to most aggressive and keeps the first that fits. Stronger
+# zlib levels barely shrink a PNG card (~1%) for ~10x the CPU, so a PNG that
+# is over budget falls back to the WebP ladder instead.
+
+CARD_FORMAT = os.environ.get('CARD_FORMAT', 'png').lower()
+PNG_COMPRESS_LEVEL = int(os.environ.get('PNG_COMPRESS_LEVEL', 3))
+PNG_OPTIMIZE = os.environ.get('PNG_OPTIMIZE', '').lower() in ('1', 'true', 'yes')
+WEBP_QUALITY = int(os.environ.get('WEBP_QUALITY', 85))
+WEBP_METHOD = int(os.environ.get('WEBP_METHOD', 4))
+JPEG_QUALITY = int(os.environ.get('JPEG_QUALITY', 88))
+# 0 disables the budget
+CARD_MAX_BYTES = int(os.environ.get('CARD_MAX_BYTES', 0))
+
+EXTENSIONS = {'png': 'png', 'webp': 'webp', 'jpeg': 'jpg'}
+
+
+class EncodedImage:
+    """Encoded card bytes plus how they were produced"""
+
+    def __init__(self, data, format, settings, seconds, stages=None):
+        self.data = data
+        self.format = format
+        self.settings = settings
+        self.seconds = seconds
+        # Per-stage render times, filled in by the renderer
+        self.stages = stages or {}
+
+    @property
+    def extension(self):
+        return EXTENSIONS[self.format]
+
+    @property
+    def filename(self):
+        return f"epic_welcome.{self.extension}"
+
+
+def normalize_format(fmt):
+    fmt = fmt.lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unsupported card format '{fmt}' (use png, webp or jpeg)")
+    return fmt
+
+
+# Fail at startup, not on the first join
+CARD_FORMAT = normalize_format(CARD_FORMAT)
+# (said once, by the main process rather than every render worker)
+if CARD_FORMAT == 'png' and CARD_MAX_BYTES and multiprocessing.current_process().name == 'MainProcess':
+    print(f"⚠️ PNG can't be squeezed much; cards over CARD_MAX_BYTES={CARD_MAX_BYTES} "
+          f"are sent as WebP instead")
+
+
+def settings_ladder(fmt):
+    """(format, save() settings) steps: configured default first, then cheaper-to-fit ones"""
+    if fmt == 'png':
+        # One PNG attempt, then WebP if a budget needs more than that
+        png = ('png', {'compress_level': PNG_COMPRESS_LEVEL, 'optimize': PNG_OPTIMIZE})
+        return [png] + settings_ladder('webp')
+    if fmt == 'webp':
+        return [('webp', {'quality': q, 'method': WEBP_METHOD})
+                for q in (WEBP_QUALITY, 75, 65, 50, 35) if q <= WEBP_QUALITY]
+    return [('jpeg', {'quality': q, 'optimize': True})
+            for q in (JPEG_QUALITY, 80, 70, 55, 40) if q <= JPEG_QUALITY]
+
+
+def encode(img, fmt=CARD_FORMAT, max_bytes=CARD_MAX_BYTES):
+    """Encode an RGB image; with a budget, the first ladder step that fits wins
+
+    If nothing fits, the smallest attempt is returned. The result's `format`
+    says what was actually used (a PNG over budget comes back as WebP).
+    """
+    fmt = normalize_format(fmt)
+    started = time.perf_counter()
+    best = None
+    for step_fmt, settings in settings_ladder(fmt):
+        buffer = io.BytesIO()
+        img.save(buffer, format=step_fmt.upper(), **settings)
+        data = buffer.getvalue()
+        if best is None or len(data) < len(best[0]):
+            best = (data, step_fmt, settings)
+        if not max_bytes or len(data) <= max_bytes:
+            break
+    return EncodedImage(best[0], best[1], best[2], time.perf_counter() - started)
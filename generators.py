@@ -0,0 +1,60 @@
+import numpy as np
+from PIL import Image
+
+# Vectorized background generators. Every function works on whole NumPy
+# arrays, so the cost of a bigger (or HiDPI) canvas is array work instead of
+# one Python iteration per row or per wave point.
+
+
+def hls_to_rgb(h, l, s):
+    """Array version of colorsys.hls_to_rgb; returns floats in 0..1, shape (..., 3)"""
+    h, l, s = np.broadcast_arrays(np.asarray(h, dtype=np.float64),
+                                  np.asarray(l, dtype=np.float64),
+                                  np.asarray(s, dtype=np.float64))
+    m2 = np.where(l <= 0.5, l * (1.0 + s), l + s - (l * s))
+    m1 = 2.0 * l - m2
+
+    def channel(hue):
+        hue = hue % 1.0
+        rising = m1 + (m2 - m1) * hue * 6.0
+        falling = m1 + (m2 - m1) * (2.0 / 3.0 - hue) * 6.0
+        return np.select([hue < 1.0 / 6.0, hue < 0.5, hue < 2.0 / 3.0],
+                         [rising, m2, falling], default=m1)
+
+    rgb = np.stack([channel(h + 1.0 / 3.0), channel(h), channel(h - 1.0 / 3.0)], axis=-1)
+    # Zero saturation is plain grey, exactly like colorsys
+    return np.where((s == 0.0)[..., None], l[..., None], rgb)
+
+
+def hls_gradient(width, height):
+    """The blue-to-purple background gradient with its sine wave influence"""
+    y = np.arange(height, dtype=np.float64)
+    hue = (240 + np.sin(y * 0.02) * 20) / 360
+    saturation = 0.8 + (y / height) * 0.2
+    lightness = 0.3 + (y / height) * 0.4
+
+    # One color per row, then stretch the rows across the canvas
+    rows = (hls_to_rgb(hue, lightness, saturation) * 255).astype(np.uint8)
+    pixels = np.broadcast_to(rows[:, None, :], (height, width, 3))
+    return Image.fromarray(np.ascontiguousarray(pixels), 'RGB')
+
+
+def wave_surface(width, y_base, amplitude, frequency, phase=0, step=1):
+    """Wave crest height for x = 0, step, 2*step, ... up to the canvas width"""
+    x = np.arange(0, width, step, dtype=np.float64)
+    return x, y_base + np.trunc(amplitude * np.sin((x + phase) * frequency))
+
+
+def wave_mask(width, height, y_base, amplitude, frequency, phase=0, alpha=255):
+    """'L' mask that is `alpha` below the wave line and 0 above it"""
+    _, top = wave_surface(width, y_base, amplitude, frequency, phase)
+    rows = np.arange(height, dtype=np.float64)[:, None]
+    mask = (rows >= top[None, :]).astype(np.uint8) * np.uint8(alpha)
+    return Image.fromarray(mask, 'L')
+
+
+def wave_crests(width, y_base, amplitude, frequency, phase=0, step=2):
+    """(x, y) of every local peak of the wave sampled every `step` pixels"""
+    x, y = wave_surface(width, y_base, amplitude, frequency, phase, step)
+    peaks = np.flatnonzero((y[1:-1] < y[:-2]) & (y[1:-1] < y[2:])) + 1
+    return [(int(x[i]), int(y[i])) for i in peaks]
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+from quality import TIERS
+
+# Per-guild settings live in one JSON file, loaded once and kept in memory.
+# The file is re-read when its mtime changes, so edits apply without a restart:
+#
+#   {
+#     "default": {"channel_name": "wlc"},
+#     "guilds": {
+#       "123456789012345678": {"channel_id": 234567890123456789, "theme": "sunset",
+#                              "quality_tier": "reduced", "enabled": true}
+#     }
+#   }
+GUILD_CONFIG = os.environ.get('GUILD_CONFIG', 'guilds.json')
+GUILD_CONFIG_POLL = float(os.environ.get('GUILD_CONFIG_POLL', 10))
+
+# Channel looked up by name for guilds that don't configure a channel ID
+WELCOME_CHANNEL = os.environ.get('WELCOME_CHANNEL', 'wlc')
+
+
+class GuildConfig:
+    """Welcome settings for one guild"""
+
+    def __init__(self, channel_id=None, channel_name=WELCOME_CHANNEL, theme='default',
+                 quality_tier=None, enabled=True):
+        if quality_tier is not None and quality_tier not in TIERS:
+            raise ValueError(f"quality_tier must be one of {TIERS}, not '{quality_tier}'")
+        self.channel_id = int(channel_id) if channel_id is not None else None
+        self.channel_name = channel_name
+        self.theme = theme
+        # Best tier this guild renders at; the load-driven controller can still go lower
+        self.quality_tier = quality_tier
+        self.enabled = enabled
+
+    @classmethod
+    def from_dict(cls, data, base=None):
+        """Build a config from a JSON object, filling gaps from `base`"""
+        if not isinstance(data, dict):
+            raise ValueError(f"guild settings must be an object, not {data!r}")
+        fields = dict(vars(base)) if base is not None else {}
+        fields.update(data)
+        return cls(**fields)
+
+
+class GuildConfigStore:
+    """In-memory guild configs, reloaded from `path` when the file changes"""
+
+    def __init__(self, path=GUILD_CONFIG, poll_interval=GUILD_CONFIG_POLL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.default = GuildConfig()
+        self.guilds = {}
+        self.mtime = None
+        self.task = None
+        # Called with no arguments after every successful (re)load
+        self.on_reload = []
+
+    def get(self, guild_id):
+        return self.guilds.get(guild_id, self.default)
+
+    def load(self):
+        """Read the config file; keeps the current configs if it's missing or invalid"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            if self.mtime is not None:
+                print(f"⚠️ Guild config '{self.path}' disappeared, keeping the last one")
+            return False
+        except OSError as e:
+            print(f"⚠️ Can't read guild config '{self.path}': {e}")
+            return False
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError("the file must hold a JSON object")
+            default_entry, guild_entries = data.get('default', {}), data.get('guilds', {})
+            if not isinstance(default_entry, dict) or not isinstance(guild_entries, dict):
+                raise ValueError('"default" and "guilds" must be objects')
+            default = GuildConfig.from_dict(default_entry)
+            guilds = {int(guild_id): GuildConfig.from_dict(entry, default)
+                      for guild_id, entry in guild_entries.items()}
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"⚠️ Ignoring invalid guild config '{self.path}': {e}")
+            return False
+
+        self.default, self.guilds = default, guilds
+        for callback in self.on_reload:
+            callback()
+        print(f"⚙️ Loaded config for {len(guilds)} guild(s) from '{self.path}'")
+        return True
+
+    def start(self):
+        self.load()
+        if self.task is None and self.poll_interval > 0:
+            self.task = asyncio.create_task(self.watch())
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            self.load()
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+class ChannelIndex:
+    """guild ID -> welcome channel, resolved once and dropped when channels change
+
+    Guilds with a configured channel ID resolve through discord.py's own
+    channel dict; the rest fall back to a one-off scan by name, which is what
+    makes caching the answer worthwhile.
+    """
+
+    def __init__(self, configs):
+        self.configs = configs
+        self.channels = {}
+        configs.on_reload.append(self.clear)
+
+    def get(self, guild):
+        channel = self.channels.get(guild.id)
+        if channel is None:
+            channel = self.resolve(guild)
+            if channel is not None:
+                self.channels[guild.id] = channel
+        return channel
+
+    def resolve(self, guild):
+        config = self.configs.get(guild.id)
+        if config.channel_id is not None:
+            return guild.get_channel(config.channel_id)
+        for channel in guild.text_channels:
+            if channel.name == config.channel_name:
+                return channel
+        return None
+
+    def invalidate(self, guild_id):
+        self.channels.pop(guild_id, None)
+
+    def clear(self):
+        self.channels.clear()
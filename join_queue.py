@@ -0,0 +1,157 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+# Join queue settings (all per guild)
+JOIN_QUEUE_SIZE = int(os.environ.get('JOIN_QUEUE_SIZE', 100))
+JOIN_WORKERS = int(os.environ.get('JOIN_WORKERS', 2))
+# Burst mode kicks in once BURST_THRESHOLD joins land within BURST_WINDOW seconds
+BURST_THRESHOLD = int(os.environ.get('BURST_THRESHOLD', 5))
+BURST_WINDOW = float(os.environ.get('BURST_WINDOW', 10))
+# Most members welcomed together on one collage card (the grid shrinks to fit
+# more, but past 8 the avatars get small)
+BURST_MAX_MEMBERS = max(2, int(os.environ.get('BURST_MAX_MEMBERS', 8)))
+
+# Running totals each guild queue keeps (exported as counters)
+COUNTERS = ('enqueued', 'dropped', 'processed', 'bursts', 'total_wait')
+
+
+class GuildJoinQueue:
+    """Bounded join queue for one guild, drained by a fixed set of workers
+
+    Normally every join gets its own card via `welcome_one(member, number)`.
+    When joins arrive faster than the burst threshold, workers drain whatever
+    is pending and hand it to `welcome_many(members, numbers)` as one collage
+    card instead. `number` is the member number captured when the join was
+    queued, so a backlog doesn't stamp everyone with the latest count.
+    """
+
+    def __init__(self, guild_id, welcome_one, welcome_many, maxsize=JOIN_QUEUE_SIZE,
+                 workers=JOIN_WORKERS):
+        self.guild_id = guild_id
+        self.welcome_one = welcome_one
+        self.welcome_many = welcome_many
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.arrivals = deque()
+
+        # Backpressure metrics
+        self.enqueued = 0
+        self.dropped = 0
+        self.processed = 0
+        self.bursts = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(max(1, workers))]
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    def in_burst(self):
+        """True while joins are arriving faster than the burst threshold"""
+        cutoff = time.monotonic() - BURST_WINDOW
+        while self.arrivals and self.arrivals[0] < cutoff:
+            self.arrivals.popleft()
+        return len(self.arrivals) >= BURST_THRESHOLD
+
+    def submit(self, member, number):
+        """Queue a join; returns False (and counts a drop) when the queue is full"""
+        now = time.monotonic()
+        self.arrivals.append(now)
+        try:
+            self.queue.put_nowait((member, number, now))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def take_pending(self, first):
+        """`first` plus as many already-queued joins as fit on one collage"""
+        batch = [first]
+        while len(batch) < BURST_MAX_MEMBERS and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def worker(self):
+        while True:
+            item = await self.queue.get()
+            batch = [item]
+            if self.in_burst() and not self.queue.empty():
+                batch = self.take_pending(item)
+
+            now = time.monotonic()
+            self.total_wait += sum(now - queued_at for _, _, queued_at in batch)
+            members = [member for member, _, _ in batch]
+            numbers = [number for _, number, _ in batch]
+            try:
+                if len(members) > 1:
+                    self.bursts += 1
+                    await self.welcome_many(members, numbers)
+                else:
+                    await self.welcome_one(members[0], numbers[0])
+            except Exception as e:
+                print(f"Join worker error in guild {self.guild_id}: {e}")
+            finally:
+                self.processed += len(batch)
+                for _ in batch:
+                    self.queue.task_done()
+
+    def close(self):
+        for task in self.workers:
+            task.cancel()
+
+
+class JoinQueueManager:
+    """Lazily creates one GuildJoinQueue per guild, dropped again by `remove`
+
+    Counters of removed queues are folded into `retired`, so the totals
+    never go backwards.
+    """
+
+    def __init__(self, welcome_one, welcome_many):
+        self.welcome_one = welcome_one
+        self.welcome_many = welcome_many
+        self.queues = {}
+        self.retired = dict.fromkeys(COUNTERS, 0)
+        self.retired_max_depth = 0
+
+    def submit(self, member, number):
+        guild_id = member.guild.id
+        queue = self.queues.get(guild_id)
+        if queue is None:
+            queue = self.queues[guild_id] = GuildJoinQueue(guild_id, self.welcome_one,
+                                                           self.welcome_many)
+        if not queue.submit(member, number):
+            print(f"Join queue full in guild {guild_id}, skipping welcome for {member}")
+
+    @property
+    def depth(self):
+        return sum(q.depth for q in self.queues.values())
+
+    @property
+    def max_depth(self):
+        return max([self.retired_max_depth] + [q.max_depth for q in self.queues.values()])
+
+    def total(self, counter):
+        """One of COUNTERS summed over every guild queue, removed ones included"""
+        return self.retired[counter] + sum(getattr(q, counter) for q in self.queues.values())
+
+    def remove(self, guild_id):
+        """Stop a guild's workers (e.g. the bot left it); joins still queued are dropped"""
+        queue = self.queues.pop(guild_id, None)
+        if queue is None:
+            return
+        queue.close()
+        queue.dropped += queue.depth
+        for counter in COUNTERS:
+            self.retired[counter] += getattr(queue, counter)
+        self.retired_max_depth = max(self.retired_max_depth, queue.max_depth)
+
+    def close(self):
+        for queue in self.queues.values():
+            queue.close()
+        self.queues = {}
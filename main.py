@@ -1,53 +1,205 @@
 import discord
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
 import aiohttp
+import asyncio
 import io
 import math
 import random
-import colorsys
 import os
-from threading import Thread
-from flask import Flask
+import time
+from render import RenderService, DETERMINISTIC_RENDER
+from avatar_cache import AvatarCache, AVATAR_FETCH_SIZE
+from join_queue import JoinQueueManager
+from quality import QualityController, TIERS, cap_tier
+from metrics import metrics, LoopLagSampler
+from web import WebServer
+from members import client_options, member_number
+from guild_config import GuildConfigStore, ChannelIndex
+from card_cache import CardCache, card_key
+from theme import ThemeStore
+from sharding import client_class, shard_options, shard_latencies, shard_for, ShardSlots
+from encoder import CARD_FORMAT
 
-# Simple web server to keep Render happy
-app = Flask(__name__)
+# Bot configuration
+intents = discord.Intents.default()
+# Needed for join events in both member cache modes (see members.py)
+intents.members = True
 
-@app.route('/')
-def home():
-    return "🌊 Epic Welcome Bot is ONLINE! 🌊"
+# Max simultaneous connections in the shared HTTP pool
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 20))
 
-def run_web():
-    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
+class WelcomeBot(client_class()):
+    """Client that owns the render worker pool and HTTP session for its whole lifetime
 
-# Start web server in background
-Thread(target=run_web, daemon=True).start()
+    A plain discord.Client, or an AutoShardedClient when sharding is on (see sharding.py).
+    """
 
-# Bot configuration
-intents = discord.Intents.default()
-intents.members = True
+    http_session = None
+    # time.time() of the last card that rendered successfully
+    last_render_at = None
+
+    async def setup_hook(self):
+        # Simple web server to keep Render happy, on our own event loop
+        await web_server.start()
+        # Pre-warm render workers before we start receiving joins
+        await render_service.start()
+        loop_lag.start()
+        guild_configs.start()
+        themes.start()
+
+    def health(self):
+        """Status reported by /healthz"""
+        latency = self.latency
+        return {
+            'ok': not self.is_closed(),
+            'ready': self.is_ready(),
+            'gateway_latency_ms': round(latency * 1000, 1) if math.isfinite(latency) else None,
+            'queue_depth': join_queue.depth,
+            'quality_tier': quality.tier,
+            'last_render_at': self.last_render_at,
+            'last_render_age_s': round(time.time() - self.last_render_at, 1) if self.last_render_at else None,
+            'shards': {shard: round(latency * 1000, 1) if math.isfinite(latency) else None
+                       for shard, latency in shard_latencies(self)},
+        }
+
+    def local_shard_count(self):
+        """How many shards this process runs"""
+        shard_ids = getattr(self, 'shard_ids', None)
+        return len(shard_ids) if shard_ids else (self.shard_count or 1)
+
+    def open_http_session(self):
+        """Create the shared, connection-pooled session (again, if it was closed)"""
+        if self.http_session is None or self.http_session.closed:
+            self.http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE),
+                timeout=aiohttp.ClientTimeout(total=10),
+            )
+
+    async def close(self):
+        loop_lag.stop()
+        guild_configs.stop()
+        themes.stop()
+        join_queue.close()
+        if self.http_session is not None:
+            await self.http_session.close()
+        render_service.shutdown()
+        await web_server.stop()
+        await super().close()
+
+render_service = RenderService()
+web_server = WebServer(lambda: bot.health())
+quality = QualityController()
+loop_lag = LoopLagSampler(metrics)
+guild_configs = GuildConfigStore()
+welcome_channels = ChannelIndex(guild_configs)
+themes = ThemeStore()
+shard_slots = ShardSlots(lambda: bot.local_shard_count())
+
+async def prepare_avatar(data):
+    """Decode and pre-render an avatar in the pool (the avatar cache's decoder)"""
+    with metrics.time('avatar_processing'):
+        return await render_service.prepare_avatar(data)
 
-bot = discord.Client(intents=intents)
+avatar_cache = AvatarCache(decode=prepare_avatar)
+card_cache = CardCache()
 
-# Welcome channel name
-WELCOME_CHANNEL = 'wlc'
+metrics.gauge('avatar_cache_hits_total', lambda: avatar_cache.hits, 'Avatar cache hits',
+              kind='counter')
+metrics.gauge('avatar_cache_misses_total', lambda: avatar_cache.misses, 'Avatar cache misses',
+              kind='counter')
+metrics.gauge('avatar_cache_coalesced_total', lambda: avatar_cache.coalesced,
+              'Avatar requests that joined an in-flight download', kind='counter')
+metrics.gauge('avatar_cache_entries', lambda: len(avatar_cache.entries), 'Cached avatars')
+metrics.gauge('avatar_cache_bytes', lambda: avatar_cache.bytes, 'Bytes held by cached avatars')
+metrics.gauge('card_cache_memory_hits_total', lambda: card_cache.memory_hits,
+              'Cards served from memory', kind='counter')
+metrics.gauge('card_cache_disk_hits_total', lambda: card_cache.disk_hits,
+              'Cards served from the disk cache', kind='counter')
+metrics.gauge('card_cache_misses_total', lambda: card_cache.misses, 'Card cache misses',
+              kind='counter')
+metrics.gauge('card_cache_disk_bytes', lambda: card_cache.disk_bytes, 'Bytes of cards cached on disk')
+metrics.gauge('join_queue_depth', lambda: join_queue.depth, 'Joins waiting in all guild queues')
+metrics.gauge('join_queue_max_depth', lambda: join_queue.max_depth,
+              'Deepest any guild join queue has been')
+metrics.gauge('join_queue_enqueued_total', lambda: join_queue.total('enqueued'),
+              'Joins queued for a welcome', kind='counter')
+metrics.gauge('join_queue_dropped_total', lambda: join_queue.total('dropped'),
+              'Joins dropped because their guild queue was full', kind='counter')
+metrics.gauge('join_queue_processed_total', lambda: join_queue.total('processed'),
+              'Joins taken off a queue and welcomed', kind='counter')
+metrics.gauge('join_queue_bursts_total', lambda: join_queue.total('bursts'),
+              'Collage cards sent for a burst of joins', kind='counter')
+metrics.gauge('join_queue_wait_seconds_total', lambda: round(join_queue.total('total_wait'), 6),
+              'Time joins spent queued (divide by processed for the average)', kind='counter')
+metrics.gauge('quality_tier_level', lambda: TIERS.index(quality.tier),
+              'Current quality tier (0 = full, 2 = minimal)')
+metrics.gauge('render_pool_recycles_total', lambda: render_service.recycles,
+              'Render pools replaced because a render timed out', kind='counter')
+metrics.gauge('render_latency_p95_seconds', lambda: round(quality.p95(), 6),
+              'p95 of recent render latencies')
+
+def shard_queue_depths():
+    depths = {}
+    for guild_id, queue in join_queue.queues.items():
+        shard = shard_for(guild_id, bot.shard_count)
+        depths[shard] = depths.get(shard, 0) + queue.depth
+    return depths
+
+metrics.gauge('shard_latency_seconds', lambda: {shard: round(latency, 6)
+                                                for shard, latency in shard_latencies(bot)
+                                                if math.isfinite(latency)},
+              'Gateway heartbeat latency per shard', label='shard')
+metrics.gauge('shard_join_queue_depth', shard_queue_depths, 'Joins waiting per shard', label='shard')
+metrics.gauge('shard_renders_active', lambda: dict(shard_slots.active),
+              'Renders in flight per shard', label='shard')
+metrics.gauge('shard_renders_waiting', lambda: dict(shard_slots.waiting),
+              'Renders waiting for a shard render slot', label='shard')
+bot = WelcomeBot(intents=intents, **client_options(), **shard_options())
 
 @bot.event
 async def on_ready():
+    bot.open_http_session()
     print(f'{bot.user} is ready! 🌊')
 
 @bot.event
 async def on_member_join(member):
+    """Queue the join; the guild's join workers do the actual welcoming"""
+    metrics.inc('joins_total', shard=member.guild.shard_id)
+    if not guild_configs.get(member.guild.id).enabled:
+        return
+    # Read the member number now; by the time a backlog is rendered it has moved on
+    join_queue.submit(member, member_number(member.guild))
+
+@bot.event
+async def on_guild_remove(guild):
+    # Left or kicked: stop the guild's join workers and forget its channel
+    join_queue.remove(guild.id)
+    welcome_channels.invalidate(guild.id)
+
+# Forget the cached welcome channel whenever a guild's channels change
+@bot.event
+async def on_guild_channel_create(channel):
+    welcome_channels.invalidate(channel.guild.id)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    welcome_channels.invalidate(channel.guild.id)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    welcome_channels.invalidate(after.guild.id)
+
+async def welcome_member(member, number):
     """Welcome new members with an ultra custom image"""
     
-    welcome_channel = discord.utils.get(member.guild.channels, name=WELCOME_CHANNEL)
+    welcome_channel = welcome_channels.get(member.guild)
     
     if not welcome_channel:
-        print(f"Welcome channel '{WELCOME_CHANNEL}' not found!")
+        print(f"Welcome channel not found in {member.guild}!")
         return
     
     try:
         # Create ultra custom welcome image
-        welcome_image = await create_epic_welcome_image(member)
+        welcome_image = await create_epic_welcome_image(member, number)
         
         # Epic welcome messages (random)
         welcome_messages = [
@@ -61,421 +213,128 @@ async def on_member_join(member):
         message = random.choice(welcome_messages)
         
         if welcome_image:
-            file = discord.File(welcome_image, filename="epic_welcome.png")
+            file = discord.File(io.BytesIO(welcome_image.data), filename=welcome_image.filename)
             await welcome_channel.send(message, file=file)
         else:
+            metrics.inc('fallbacks_total')
             await welcome_channel.send(message)
             
     except Exception as e:
         print(f"Error: {e}")
+        metrics.inc('welcome_failures_total')
+        metrics.inc('fallbacks_total')
         await welcome_channel.send(f"🌊 Welcome {member.mention}! 🌊")
 
-async def create_epic_welcome_image(member):
-    """Create an absolutely EPIC welcome image"""
+async def welcome_members(members, numbers):
+    """Welcome a burst of joins with one collage card and one message"""
+    
+    welcome_channel = welcome_channels.get(members[0].guild)
+    
+    if not welcome_channel:
+        print(f"Welcome channel not found in {members[0].guild}!")
+        return
+    
+    mentions = ", ".join(member.mention for member in members)
     try:
-        width, height = 1000, 500
-        
-        # Create base image with dynamic gradient
-        img = Image.new('RGB', (width, height))
-        draw = ImageDraw.Draw(img)
-        
-        # Epic animated-style gradient background
-        for y in range(height):
-            # Multi-color gradient with wave influence
-            wave_influence = math.sin(y * 0.02) * 20
-            
-            # Calculate color based on position
-            hue = (240 + wave_influence) / 360  # Blue to purple range
-            saturation = 0.8 + (y / height) * 0.2
-            lightness = 0.3 + (y / height) * 0.4
-            
-            rgb = colorsys.hls_to_rgb(hue, lightness, saturation)
-            color = tuple(int(c * 255) for c in rgb)
-            
-            draw.rectangle([(0, y), (width, y + 1)], fill=color)
-        
-        # Add particle effects
-        for _ in range(50):
-            x = random.randint(0, width)
-            y = random.randint(0, height)
-            size = random.randint(2, 8)
-            alpha = random.randint(100, 255)
-            
-            # Create star-like particles
-            particle_color = (255, 255, 255, alpha)
-            overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-            particle_draw = ImageDraw.Draw(overlay)
-            particle_draw.ellipse([x - size, y - size, x + size, y + size], fill=particle_color)
-            
-            # Convert overlay to RGB and blend
-            particle_rgb = Image.new('RGB', (width, height), (255, 255, 255))
-            particle_rgb.paste(overlay, (0, 0), overlay)
-            img = Image.blend(img, particle_rgb, alpha / 255 * 0.3)
-        
-        # Draw EPIC cartoon waves with multiple layers
-        wave_layers = [
-            {'y_base': height - 60, 'amplitude': 40, 'frequency': 0.015, 'color': (0, 191, 255, 200)},
-            {'y_base': height - 100, 'amplitude': 30, 'frequency': 0.02, 'color': (30, 144, 255, 150)},
-            {'y_base': height - 140, 'amplitude': 25, 'frequency': 0.025, 'color': (65, 105, 225, 100)},
-        ]
-        
-        for wave in wave_layers:
-            overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-            wave_draw = ImageDraw.Draw(overlay)
-            
-            points = []
-            for x in range(0, width + 20, 3):
-                y = wave['y_base'] + int(wave['amplitude'] * math.sin(x * wave['frequency']))
-                points.append((x, y))
-            
-            # Close the wave shape
-            points.extend([(width, height), (0, height)])
-            wave_draw.polygon(points, fill=wave['color'])
-            
-            # Convert to RGB and paste
-            wave_rgb = Image.new('RGB', (width, height))
-            wave_rgb.paste(img, (0, 0))
-            wave_rgb.paste(overlay, (0, 0), overlay)
-            img = wave_rgb
-        
-        # Add foam/splash effects
-        foam_overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-        foam_draw = ImageDraw.Draw(foam_overlay)
-        
-        for i in range(20):
-            x = random.randint(50, width - 50)
-            y = random.randint(height - 150, height - 50)
-            size = random.randint(5, 20)
-            foam_draw.ellipse([x - size, y - size, x + size, y + size], 
-                            fill=(255, 255, 255, random.randint(80, 150)))
-        
-        img.paste(foam_overlay, (0, 0), foam_overlay)
-        
-        # Get and process user avatar
-        async with aiohttp.ClientSession() as session:
-            async with session.get(str(member.display_avatar.url)) as resp:
-                if resp.status == 200:
-                    avatar_data = await resp.read()
-                    avatar = Image.open(io.BytesIO(avatar_data))
-                    
-                    # Epic avatar processing
-                    avatar_size = 150
-                    avatar = avatar.resize((avatar_size, avatar_size), Image.Resampling.LANCZOS)
-                    
-                    # Create epic circular mask with glow effect
-                    mask_size = avatar_size + 20
-                    mask = Image.new('L', (mask_size, mask_size), 0)
-                    mask_draw = ImageDraw.Draw(mask)
-                    
-                    # Multiple circles for glow effect
-                    for i in range(10, 0, -1):
-                        alpha = int(255 * (1 - i / 10) * 0.3)
-                        circle_size = avatar_size + i * 2
-                        x_offset = (mask_size - circle_size) // 2
-                        mask_draw.ellipse([x_offset, x_offset, 
-                                         x_offset + circle_size, x_offset + circle_size], 
-                                        fill=alpha)
-                    
-                    # Main avatar circle
-                    center = mask_size // 2
-                    mask_draw.ellipse([center - avatar_size//2, center - avatar_size//2,
-                                     center + avatar_size//2, center + avatar_size//2], 
-                                    fill=255)
-                    
-                    # Create glowing avatar
-                    glow_avatar = Image.new('RGBA', (mask_size, mask_size), (0, 0, 0, 0))
-                    
-                    # Add rainbow glow border
-                    glow_draw = ImageDraw.Draw(glow_avatar)
-                    for i in range(8):
-                        hue = i / 8
-                        rgb = colorsys.hls_to_rgb(hue, 0.5, 1.0)
-                        color = tuple(int(c * 255) for c in rgb) + (100,)
-                        
-                        border_thickness = 8 - i
-                        glow_draw.ellipse([center - avatar_size//2 - border_thickness, 
-                                         center - avatar_size//2 - border_thickness,
-                                         center + avatar_size//2 + border_thickness, 
-                                         center + avatar_size//2 + border_thickness], 
-                                        outline=color, width=2)
-                    
-                    # Paste resized avatar
-                    avatar_resized = Image.new('RGBA', (mask_size, mask_size), (0, 0, 0, 0))
-                    avatar_x = (mask_size - avatar_size) // 2
-                    avatar_resized.paste(avatar, (avatar_x, avatar_x))
-                    avatar_resized.putalpha(mask)
-                    
-                    # Combine glow and avatar
-                    final_avatar = Image.alpha_composite(glow_avatar, avatar_resized)
-                    
-                    # Paste on main image
-                    avatar_pos_x = (width - mask_size) // 2
-                    avatar_pos_y = 30
-                    img.paste(final_avatar, (avatar_pos_x, avatar_pos_y), final_avatar)
-        
-        # EPIC text with multiple effects
-        try:
-            font_title = ImageFont.truetype("arial.ttf", 60)
-            font_subtitle = ImageFont.truetype("arial.ttf", 32)
-            font_small = ImageFont.truetype("arial.ttf", 20)
-        except:
-            font_title = ImageFont.load_default()
-            font_subtitle = ImageFont.load_default()
-            font_small = ImageFont.load_default()
-        
-        # Main welcome text with rainbow effect
-        welcome_text = f"WELCOME {member.display_name.upper()}!"
-        text_x = width // 2
-        text_y = 280
-        
-        # Rainbow text effect
-        if font_title:
-            text_width = draw.textlength(welcome_text, font=font_title)
-            start_x = text_x - text_width // 2
-            
-            char_x = start_x
-            for i, char in enumerate(welcome_text):
-                hue = (i * 30) % 360
-                rgb = colorsys.hls_to_rgb(hue / 360, 0.7, 1.0)
-                color = tuple(int(c * 255) for c in rgb)
-                
-                # Text shadow
-                for offset in [(-3, -3), (-3, 3), (3, -3), (3, 3)]:
-                    draw.text((char_x + offset[0], text_y + offset[1]), char, 
-                             font=font_title, fill=(0, 0, 0))
-                
-                # Rainbow character
-                draw.text((char_x, text_y), char, font=font_title, fill=color)
-                char_x += draw.textlength(char, font=font_title)
-        
-        # Subtitle with glow
-        if font_subtitle:
-            subtitle = "🌊 DIVE INTO THE ADVENTURE! 🌊"
-            
-            # Glow effect
-            for radius in range(5, 0, -1):
-                alpha = int(100 * (6 - radius) / 5)
-                glow_color = (0, 255, 255, alpha)
-                
-                for angle in range(0, 360, 30):
-                    offset_x = int(radius * math.cos(math.radians(angle)))
-                    offset_y = int(radius * math.sin(math.radians(angle)))
-                    
-                    overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-                    overlay_draw = ImageDraw.Draw(overlay)
-                    overlay_draw.text((text_x + offset_x, text_y + 80 + offset_y), 
-                                    subtitle, font=font_subtitle, fill=glow_color, anchor="mm")
-                    
-                    img_rgba = img.convert('RGBA')
-                    img_rgba = Image.alpha_composite(img_rgba, overlay)
-                    img = img_rgba.convert('RGB')
-            
-            # Main subtitle text
-            draw = ImageDraw.Draw(img)
-            draw.text((text_x, text_y + 80), subtitle, font=font_subtitle, 
-                     fill=(255, 255, 255), anchor="mm")
-        
-        # Add member count with epic styling
-        if font_small:
-            member_count = f"MEMBER #{len(member.guild.members)} HAS ARRIVED!"
-            
-            # Metallic effect
-            for offset_y in range(3):
-                shade = 150 + offset_y * 35
-                draw.text((text_x, text_y + 140 + offset_y), member_count, 
-                         font=font_small, fill=(shade, shade, 0), anchor="mm")
-            
-            draw.text((text_x, text_y + 140), member_count, 
-                     font=font_small, fill=(255, 255, 100), anchor="mm")
-        
-        # Add decorative elements
-        # Lightning bolts
-        lightning_points = [
-            [(100, 100), (120, 150), (110, 150), (130, 200)],
-            [(870, 120), (850, 170), (860, 170), (840, 220)],
-        ]
-        
-        for lightning in lightning_points:
-            # Glow effect
-            for thickness in range(8, 0, -1):
-                alpha = int(50 * (9 - thickness) / 8)
-                overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-                overlay_draw = ImageDraw.Draw(overlay)
-                overlay_draw.polygon(lightning, outline=(255, 255, 0, alpha), width=thickness)
-                
-                img_rgba = img.convert('RGBA')
-                img_rgba = Image.alpha_composite(img_rgba, overlay)
-                img = img_rgba.convert('RGB')
-            
-            # Main lightning
-            draw = ImageDraw.Draw(img)
-            draw.polygon(lightning, outline=(255, 255, 255), width=3)
-            draw.polygon(lightning, fill=(255, 255, 0))
-        
-        # Animated-style sparkles
-        sparkle_positions = [
-            (150, 80), (200, 60), (800, 90), (750, 70),
-            (120, 300), (880, 320), (50, 250), (950, 280)
-        ]
+        welcome_image = await create_burst_welcome_image(members, numbers)
+        message = f"🌊 **WAVE SET INCOMING!** {mentions} just crashed into our server together! Welcome aboard! 🏄‍♂️"
         
-        for x, y in sparkle_positions:
-            # Draw sparkle
-            sparkle_size = random.randint(8, 15)
-            sparkle_color = (255, 255, 255)
-            
-            # Four-pointed star
-            points = [
-                (x, y - sparkle_size),  # top
-                (x + 3, y - 3),
-                (x + sparkle_size, y),  # right
-                (x + 3, y + 3),
-                (x, y + sparkle_size),  # bottom
-                (x - 3, y + 3),
-                (x - sparkle_size, y),  # left
-                (x - 3, y - 3)
-            ]
-            
-            # Glow
-            for glow_size in range(5, 0, -1):
-                glow_alpha = int(80 * (6 - glow_size) / 5)
-                overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-                overlay_draw = ImageDraw.Draw(overlay)
-                
-                glow_points = [(px + random.randint(-glow_size, glow_size), 
-                               py + random.randint(-glow_size, glow_size)) for px, py in points]
-                overlay_draw.polygon(glow_points, fill=(255, 255, 255, glow_alpha))
-                
-                img_rgba = img.convert('RGBA')
-                img_rgba = Image.alpha_composite(img_rgba, overlay)
-                img = img_rgba.convert('RGB')
-            
-            # Main sparkle
-            draw = ImageDraw.Draw(img)
-            draw.polygon(points, fill=sparkle_color)
-        
-        # Epic wave patterns with transparency
-        for wave_layer in range(3):
-            overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-            wave_draw = ImageDraw.Draw(overlay)
-            
-            wave_y = height - 80 - (wave_layer * 40)
-            wave_amplitude = 50 - (wave_layer * 10)
-            wave_frequency = 0.01 + (wave_layer * 0.005)
-            wave_phase = wave_layer * 100
-            
-            # Create wave path
-            points = []
-            for x in range(0, width + 30, 2):
-                y = wave_y + int(wave_amplitude * math.sin((x + wave_phase) * wave_frequency))
-                points.append((x, y))
-            
-            # Add foam caps on waves
-            foam_points = []
-            for i in range(0, len(points) - 1):
-                x1, y1 = points[i]
-                x2, y2 = points[i + 1]
-                
-                # Add foam where wave peaks
-                if i > 0 and i < len(points) - 1:
-                    prev_y = points[i - 1][1]
-                    next_y = points[i + 1][1]
-                    
-                    if y1 < prev_y and y1 < next_y:  # Wave peak
-                        foam_points.extend([
-                            (x1 - 10, y1 - 5),
-                            (x1 + 10, y1 - 5),
-                            (x1 + 15, y1 + 5),
-                            (x1 - 15, y1 + 5)
-                        ])
-            
-            # Close wave shape
-            points.extend([(width, height), (0, height)])
-            
-            # Wave colors with transparency
-            wave_colors = [
-                (0, 255, 255, 120),    # Cyan
-                (30, 144, 255, 100),   # Dodger blue  
-                (65, 105, 225, 80)     # Royal blue
-            ]
-            
-            wave_draw.polygon(points, fill=wave_colors[wave_layer])
-            
-            # Add foam
-            if foam_points:
-                for i in range(0, len(foam_points), 4):
-                    if i + 3 < len(foam_points):
-                        foam_quad = foam_points[i:i+4]
-                        wave_draw.polygon(foam_quad, fill=(255, 255, 255, 200))
+        if welcome_image:
+            file = discord.File(io.BytesIO(welcome_image.data), filename=welcome_image.filename)
+            await welcome_channel.send(message, file=file)
+        else:
+            metrics.inc('fallbacks_total')
+            await welcome_channel.send(message)
             
-            # Blend wave layer
-            img_rgba = img.convert('RGBA')
-            img = Image.alpha_composite(img_rgba, overlay).convert('RGB')
-        
-        # Get user avatar with EPIC processing
-        async with aiohttp.ClientSession() as session:
-            async with session.get(str(member.display_avatar.url)) as resp:
-                if resp.status == 200:
-                    avatar_data = await resp.read()
-                    avatar = Image.open(io.BytesIO(avatar_data))
-                    
-                    # Epic avatar size
-                    avatar_size = 180
-                    avatar = avatar.resize((avatar_size, avatar_size), Image.Resampling.LANCZOS)
-                    
-                    # Create epic border with multiple rings
-                    border_size = avatar_size + 40
-                    border_img = Image.new('RGBA', (border_size, border_size), (0, 0, 0, 0))
-                    border_draw = ImageDraw.Draw(border_img)
-                    
-                    # Multiple colorful rings
-                    ring_colors = [
-                        (255, 0, 255, 200),   # Magenta
-                        (0, 255, 255, 180),   # Cyan
-                        (255, 255, 0, 160),   # Yellow
-                        (255, 255, 255, 220)  # White
-                    ]
-                    
-                    for i, color in enumerate(ring_colors):
-                        ring_thickness = 3
-                        ring_radius = avatar_size // 2 + 10 + (i * 5)
-                        center = border_size // 2
-                        
-                        border_draw.ellipse([center - ring_radius, center - ring_radius,
-                                           center + ring_radius, center + ring_radius], 
-                                          outline=color, width=ring_thickness)
-                    
-                    # Create circular avatar
-                    mask = Image.new('L', (avatar_size, avatar_size), 0)
-                    mask_draw = ImageDraw.Draw(mask)
-                    mask_draw.ellipse((0, 0, avatar_size, avatar_size), fill=255)
-                    
-                    circular_avatar = Image.new('RGBA', (avatar_size, avatar_size), (0, 0, 0, 0))
-                    circular_avatar.paste(avatar, (0, 0))
-                    circular_avatar.putalpha(mask)
-                    
-                    # Position avatar in border
-                    avatar_offset = (border_size - avatar_size) // 2
-                    border_img.paste(circular_avatar, (avatar_offset, avatar_offset), circular_avatar)
-                    
-                    # Paste final avatar on main image
-                    final_x = (width - border_size) // 2
-                    final_y = 40
-                    
-                    img_rgba = img.convert('RGBA')
-                    img_rgba.paste(border_img, (final_x, final_y), border_img)
-                    img = img_rgba.convert('RGB')
-        
-        # Convert to bytes
-        img_bytes = io.BytesIO()
-        img.save(img_bytes, format='PNG', quality=95)
-        img_bytes.seek(0)
-        
-        return img_bytes
-        
+    except Exception as e:
+        print(f"Error: {e}")
+        metrics.inc('welcome_failures_total')
+        metrics.inc('fallbacks_total')
+        await welcome_channel.send(f"🌊 Welcome {mentions}! 🌊")
+
+async def fetch_avatar(member):
+    """Prepared avatar for a member from the shared cache, or None"""
+    bot.open_http_session()
+    asset = member.display_avatar
+    try:
+        avatar = await avatar_cache.get(bot.http_session, asset.key,
+                                        str(asset.with_size(AVATAR_FETCH_SIZE).url))
+    except Exception as e:
+        print(f"Error fetching avatar for {member}: {e}")
+        return None
+    return avatar.image if avatar else None
+
+async def create_epic_welcome_image(member, count):
+    """Create an absolutely EPIC welcome image"""
+    try:
+        config = guild_configs.get(member.guild.id)
+        tier = cap_tier(quality.current_tier(join_queue.depth), config.quality_tier)
+        theme = themes.get(config.theme)
+
+        # Rejoins and send retries usually find their card already rendered
+        # (the theme digest keeps edited themes from serving stale cards)
+        key = card_key(member.display_avatar.key, member.display_name, count,
+                       theme.digest if theme else None, tier, CARD_FORMAT)
+        card = await card_cache.get(key)
+        if card is not None:
+            return card
+
+        # Only the async I/O happens here; the pixels are pushed in a worker process
+        avatar = await fetch_avatar(member)
+        seed = member.id if DETERMINISTIC_RENDER else None
+        shard = member.guild.shard_id
+        async with shard_slots.slot(shard):
+            started = time.perf_counter()
+            card = await render_service.render(member.display_name, count, avatar, tier, seed, theme)
+        quality.record(time.perf_counter() - started)
+        metrics.inc('renders_total', kind='single', tier=tier, shard=shard)
+        bot.last_render_at = time.time()
+        metrics.observe_stages(card.stages)
+        # A card without its avatar (failed download) shouldn't stick around
+        if avatar is not None:
+            await card_cache.put(key, card)
+        return card
+
+    except asyncio.TimeoutError:
+        # The slowest renders are the ones the quality controller most needs to see
+        quality.record(render_service.timeout)
+        metrics.inc('render_timeouts_total')
+        print(f"Welcome image for {member} timed out after {render_service.timeout}s")
+        return None
     except Exception as e:
         print(f"Error creating epic welcome image: {e}")
         return None
 
+async def create_burst_welcome_image(members, numbers):
+    """One collage card for several members who joined together"""
+    try:
+        avatars = await asyncio.gather(*[fetch_avatar(member) for member in members])
+        entries = [(member.display_name, avatar) for member, avatar in zip(members, avatars)]
+        config = guild_configs.get(members[0].guild.id)
+        tier = cap_tier(quality.current_tier(join_queue.depth), config.quality_tier)
+        shard = members[0].guild.shard_id
+        async with shard_slots.slot(shard):
+            started = time.perf_counter()
+            card = await render_service.render_collage(entries, min(numbers), max(numbers),
+                                                       tier, themes.get(config.theme))
+        quality.record(time.perf_counter() - started)
+        metrics.inc('renders_total', kind='burst', tier=tier, shard=shard)
+        bot.last_render_at = time.time()
+        metrics.observe_stages(card.stages)
+        return card
+
+    except asyncio.TimeoutError:
+        # The slowest renders are the ones the quality controller most needs to see
+        quality.record(render_service.timeout)
+        metrics.inc('render_timeouts_total')
+        print(f"Burst welcome image timed out after {render_service.timeout}s")
+        return None
+    except Exception as e:
+        print(f"Error creating burst welcome image: {e}")
+        return None
+
+join_queue = JoinQueueManager(welcome_member, welcome_members)
+
 # Run the bot
 if __name__ == "__main__":
     bot.run(os.getenv('TOKEN'))
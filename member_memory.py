@@ -0,0 +1,105 @@
+"""Memory report: full vs lean member caching on a synthetic large guild
+
+Feeds discord.py's own gateway parsers a synthetic guild of N members (as if
+chunked at startup in full mode) plus a run of member joins, once per member
+cache mode, and reports the memory each mode keeps (tracemalloc) and what the
+join handler would see as the member count. No Discord connection needed.
+
+    python member_memory.py --members 100000 --joins 500 --output members.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import tracemalloc
+
+import discord
+
+from members import MEMBER_CACHE_MODES, client_options, member_number
+
+GUILD_ID = 1
+
+
+def guild_payload(member_count):
+    return {
+        'id': str(GUILD_ID), 'name': 'Synthetic', 'owner_id': '1',
+        'member_count': member_count, 'large': True, 'unavailable': False,
+        'roles': [{'id': str(GUILD_ID), 'name': '@everyone', 'permissions': '0', 'position': 0,
+                   'color': 0, 'hoist': False, 'managed': False, 'mentionable': False}],
+        'channels': [], 'members': [], 'presences': [], 'emojis': [], 'stickers': [],
+        'features': [],
+    }
+
+
+def member_payload(i):
+    return {
+        'user': {'id': str(10**17 + i), 'username': f'user{i}', 'discriminator': '0',
+                 'global_name': f'User {i}', 'avatar': f'{i:032x}'},
+        'guild_id': str(GUILD_ID), 'roles': [], 'nick': None, 'flags': 0,
+        'joined_at': '2024-01-01T00:00:00+00:00', 'deaf': False, 'mute': False,
+    }
+
+
+async def measure(mode, member_count, joins):
+    intents = discord.Intents.default()
+    intents.members = True
+    client = discord.Client(intents=intents, **client_options(mode))
+    state = client._connection
+
+    seen_counts = []
+    state.dispatch = lambda event, *args: (
+        seen_counts.append(member_number(args[0].guild)) if event == 'member_join' else None)
+
+    state.parse_guild_create(guild_payload(member_count))
+    guild = client.get_guild(GUILD_ID)
+
+    # Build all payloads up front so they aren't counted against the cache
+    existing = [member_payload(i) for i in range(member_count)] if state.member_cache_flags.joined else []
+    new_joins = [member_payload(member_count + i) for i in range(joins)]
+
+    gc.collect()
+    tracemalloc.start()
+    # What chunking at startup leaves in the cache
+    for data in existing:
+        guild._add_member(discord.Member(data=data, guild=guild, state=state))
+    del existing
+    for data in new_joins:
+        state.parse_guild_member_add(data)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'cached_members': len(guild.members),
+        'member_count': guild.member_count,
+        'last_join_saw_member_number': seen_counts[-1] if seen_counts else None,
+        'retained_mb': round(retained / 1e6, 2),
+        'peak_mb': round(peak / 1e6, 2),
+    }
+
+
+async def main(args):
+    report = {'members': args.members, 'joins': args.joins, 'modes': {}}
+    for mode in MEMBER_CACHE_MODES:
+        report['modes'][mode] = await measure(mode, args.members, args.joins)
+
+    full, lean = report['modes']['full'], report['modes']['lean']
+    report['saved_mb'] = round(full['retained_mb'] - lean['retained_mb'], 2)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--members', type=int, default=100000, help='size of the synthetic guild')
+    parser.add_argument('--joins', type=int, default=500, help='member joins to replay')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
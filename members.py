@@ -0,0 +1,29 @@
+import discord
+import os
+
+# Member caching. 'full' keeps every guild's member list in memory (discord.py's
+# default with the members intent); 'lean' caches no members and skips chunking,
+# since the join handler gets the member from the event and only needs the
+# guild's member count, which the gateway keeps up to date either way.
+MEMBER_CACHE = os.environ.get('MEMBER_CACHE', 'full').lower()
+MEMBER_CACHE_MODES = ('full', 'lean')
+
+if MEMBER_CACHE not in MEMBER_CACHE_MODES:
+    raise ValueError(f"MEMBER_CACHE must be one of {MEMBER_CACHE_MODES}, not '{MEMBER_CACHE}'")
+
+
+def client_options(mode=MEMBER_CACHE):
+    """Extra discord.Client keyword arguments for a member cache mode"""
+    if mode == 'lean':
+        return {
+            'member_cache_flags': discord.MemberCacheFlags.none(),
+            'chunk_guilds_at_startup': False,
+        }
+    return {}
+
+
+def member_number(guild):
+    """The guild's member count, without needing its member list cached"""
+    if guild.member_count is not None:
+        return guild.member_count
+    return len(guild.members)
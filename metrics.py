@@ -0,0 +1,161 @@
+import asyncio
+import time
+from contextlib import contextmanager
+
+# Lightweight metrics in Prometheus text format. StageTimer is used inside the
+# render workers (its results travel back with the encoded card); Metrics
+# lives in the bot process and is what the /metrics route renders.
+
+PREFIX = 'welcome'
+
+
+class StageTimer:
+    """Accumulates wall time per named stage"""
+
+    def __init__(self):
+        self.stages = {}
+        self.last = time.perf_counter()
+
+    def lap(self, name):
+        """Charge the time since the previous lap (or creation) to `name`"""
+        now = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + now - self.last
+        self.last = now
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    inner = ','.join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    return '{' + inner + '}'
+
+
+class Metrics:
+    """Counters, stage-time summaries and callback gauges for the bot process"""
+
+    def __init__(self):
+        self.counters = {}
+        self.summaries = {}
+        self.gauges = {}
+        self.help = {}
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        total, count = self.summaries.get(key, (0.0, 0))
+        self.summaries[key] = (total + seconds, count + 1)
+
+    def observe_stages(self, stages):
+        for stage, seconds in stages.items():
+            self.observe('render_stage_seconds', seconds, stage=stage)
+
+    @contextmanager
+    def time(self, stage):
+        """Time a bot-side stage (avatar fetch, avatar processing, ...)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('render_stage_seconds', time.perf_counter() - started, stage=stage)
+
+    def gauge(self, name, func, text=None, label=None, kind='gauge'):
+        """Register a gauge read from `func()` at scrape time
+
+        With a `label`, `func()` returns {label value: gauge value} and each
+        entry becomes its own series (e.g. one per shard). Pass
+        kind='counter' for values that only go up, such as hit counts kept
+        by another object (and name them *_total).
+        """
+        self.gauges[name] = (func, label, kind)
+        if text:
+            self.help[name] = text
+
+    def render(self):
+        """All metrics in Prometheus text exposition format"""
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            full = f'{PREFIX}_{name}'
+            if full in typed:
+                return full
+            typed.add(full)
+            if name in self.help:
+                lines.append(f'# HELP {full} {self.help[name]}')
+            lines.append(f'# TYPE {full} {kind}')
+            return full
+
+        for (name, labels), value in sorted(self.counters.items()):
+            full = header(name, 'counter')
+            lines.append(f'{full}{_labels(dict(labels))} {value}')
+        for (name, labels), (total, count) in sorted(self.summaries.items()):
+            full = header(name, 'summary')
+            lines.append(f'{full}_sum{_labels(dict(labels))} {total:.6f}')
+            lines.append(f'{full}_count{_labels(dict(labels))} {count}')
+        for name, (func, label, kind) in sorted(self.gauges.items()):
+            try:
+                value = func()
+            except Exception:
+                continue
+            full = header(name, kind)
+            if label is None:
+                lines.append(f'{full} {value}')
+                continue
+            for key, item in sorted(value.items()):
+                lines.append(f'{full}{_labels({label: key})} {item}')
+        return '\n'.join(lines) + '\n'
+
+
+class LoopLagSampler:
+    """Measures how late the event loop wakes a sleeping task"""
+
+    def __init__(self, metrics, interval=0.5):
+        self.metrics = metrics
+        self.interval = interval
+        self.last = 0.0
+        self.max = 0.0
+        self.task = None
+        metrics.gauge('event_loop_lag_last_seconds', lambda: round(self.last, 6),
+                      'Most recent event loop lag sample')
+        metrics.gauge('event_loop_lag_max_seconds', lambda: round(self.max, 6),
+                      'Worst event loop lag seen')
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, loop.time() - expected)
+            self.max = max(self.max, self.last)
+            self.metrics.observe('event_loop_lag_seconds', self.last)
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+metrics = Metrics()
+metrics.describe('joins_total', 'Member joins received')
+metrics.describe('welcome_failures_total', 'Welcomes that raised while rendering or sending')
+metrics.describe('fallbacks_total', 'Welcomes sent without a card')
+metrics.describe('render_stage_seconds', 'Time spent per render stage')
+metrics.describe('event_loop_lag_seconds', 'Event loop wake-up lag samples')
@@ -0,0 +1,95 @@
+import math
+import os
+from collections import deque
+
+# Quality tiers trade visual effects for render latency. Each tier names the
+# optional effects the renderer draws; everything else (gradient, waves,
+# framed avatar, text) is always drawn.
+FULL, REDUCED, MINIMAL = 'full', 'reduced', 'minimal'
+TIERS = [FULL, REDUCED, MINIMAL]
+
+TIER_EFFECTS = {
+    FULL: frozenset({'particles', 'foam', 'lightning_glow', 'sparkles', 'sparkle_glow',
+                     'foam_caps', 'avatar_glow', 'title_shadow', 'subtitle_glow'}),
+    REDUCED: frozenset({'foam', 'sparkles', 'title_shadow', 'subtitle_glow'}),
+    MINIMAL: frozenset(),
+}
+
+# 'auto' lets the controller pick; any tier name pins it
+QUALITY_TIER = os.environ.get('QUALITY_TIER', 'auto')
+# p95 render latency (seconds) the controller tries to stay under
+RENDER_P95_TARGET = float(os.environ.get('RENDER_P95_TARGET', 1.5))
+# Total queued joins that count as overload regardless of latency
+QUALITY_QUEUE_LIMIT = int(os.environ.get('QUALITY_QUEUE_LIMIT', 20))
+QUALITY_WINDOW = int(os.environ.get('QUALITY_WINDOW', 50))
+
+
+def effects_for(tier):
+    return TIER_EFFECTS.get(tier, TIER_EFFECTS[FULL])
+
+
+def cap_tier(tier, ceiling):
+    """The lower-quality of `tier` and an optional `ceiling` tier"""
+    if ceiling is None:
+        return tier
+    return TIERS[max(TIERS.index(tier), TIERS.index(ceiling))]
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a non-empty sequence"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class QualityController:
+    """Steps the quality tier down under load and back up once it recovers
+
+    Watches the last `window` render latencies and the join queue depth. The
+    tier drops one step when p95 latency exceeds the target (or the queue is
+    over its limit) and rises one step when p95 is under half the target with
+    an empty queue. After each change it waits for a fresh half-window of
+    samples so one slow render can't make it flap.
+    """
+
+    def __init__(self, target_p95=RENDER_P95_TARGET, queue_limit=QUALITY_QUEUE_LIMIT,
+                 window=QUALITY_WINDOW, fixed_tier=None):
+        if fixed_tier is None and QUALITY_TIER in TIERS:
+            fixed_tier = QUALITY_TIER
+        self.target_p95 = target_p95
+        self.queue_limit = queue_limit
+        self.fixed_tier = fixed_tier
+        self.latencies = deque(maxlen=window)
+        self.level = TIERS.index(fixed_tier) if fixed_tier else 0
+        self.samples_since_change = 0
+
+    @property
+    def tier(self):
+        return TIERS[self.level]
+
+    def record(self, latency):
+        self.latencies.append(latency)
+        self.samples_since_change += 1
+
+    def p95(self):
+        return percentile(self.latencies, 95) if self.latencies else 0.0
+
+    def current_tier(self, queue_depth=0):
+        """Re-evaluate with the latest samples and return the tier to render at"""
+        if self.fixed_tier:
+            return self.fixed_tier
+
+        settled = self.samples_since_change >= max(1, self.latencies.maxlen // 2)
+        overloaded = queue_depth > self.queue_limit
+        if self.level < len(TIERS) - 1 and (overloaded or (settled and self.p95() > self.target_p95)):
+            self._change(+1)
+        elif (self.level > 0 and settled and queue_depth == 0
+              and self.p95() < self.target_p95 / 2):
+            self._change(-1)
+        return self.tier
+
+    def _change(self, step):
+        self.level += step
+        self.samples_since_change = 0
+        self.latencies.clear()
+        print(f"🎚️ Render quality is now '{self.tier}'")
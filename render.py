@@ -0,0 +1,302 @@
+from PIL import Image
+import asyncio
+import io
+import multiprocessing
+import random
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import encoder
+from compositing import Canvas
+from avatar import prepare_avatar, ring_border, FRAMED_AVATAR_SIZE
+from text import draw_rainbow_title, draw_glowing_text, draw_metallic_text
+from theme import SAMPLE_FIELDS, compile_plan, default_theme
+from quality import FULL, TIERS, effects_for
+from metrics import StageTimer
+
+# Render worker settings
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', 2))
+RENDER_TIMEOUT = float(os.environ.get('RENDER_TIMEOUT', 20))
+
+# How many randomized backgrounds each worker keeps in memory
+BACKGROUND_VARIANTS = int(os.environ.get('BACKGROUND_VARIANTS', 4))
+
+# Deterministic mode: background variants come from fixed seeds (identical in
+# every worker and across restarts) and the variant is picked by the render's
+# seed (the member ID), so the same inputs always produce the same card
+DETERMINISTIC_RENDER = os.environ.get('DETERMINISTIC_RENDER', '1').lower() in ('1', 'true', 'yes')
+
+# Workers come from a fork server (or are spawned where there's none) rather
+# than forked from the bot itself: by the time a pool is (re)started the bot
+# runs aiohttp, DNS and to_thread threads, and forking a threaded process can
+# leave the child stuck on a lock some other thread held. The fork server
+# preloads the heavy imports, so new workers don't each pay for them.
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    POOL_CONTEXT = multiprocessing.get_context('forkserver')
+    POOL_CONTEXT.set_forkserver_preload(['numpy', 'PIL.Image'])
+else:
+    POOL_CONTEXT = multiprocessing.get_context('spawn')
+
+# Compiled themes kept per worker (each holds its own background variants)
+THEME_PLAN_CACHE = int(os.environ.get('THEME_PLAN_CACHE', 8))
+
+# digest -> RenderPlan, least recently used first
+_plans = OrderedDict()
+
+
+def plan_for(theme=None):
+    """Compiled RenderPlan for a Theme (the default theme if None), cached by digest"""
+    theme = theme or default_theme()
+    plan = _plans.get(theme.digest)
+    if plan is None:
+        plan = compile_plan(theme)
+        _plans[theme.digest] = plan
+        # Dropping an old plan drops its background variants with it
+        while len(_plans) > THEME_PLAN_CACHE:
+            _plans.popitem(last=False)
+    _plans.move_to_end(theme.digest)
+    return plan
+
+
+def render_background(plan, tier=FULL, timer=None, rng=random):
+    """Render one randomized variant of the plan's static layers (RGBA)
+
+    `tier` selects which optional effects are drawn (see quality.py); stage
+    times go to `timer` when one is given. Randomness comes from `rng`.
+    """
+    effects = effects_for(tier)
+    timer = timer or StageTimer()
+    canvas = Canvas(Image.new('RGBA', (plan.width, plan.height), (0, 0, 0, 255)))
+    for stage, effect, draw in plan.static:
+        if effect is None or effect in effects:
+            draw(canvas, effects, rng)
+        timer.lap(stage)
+    return canvas.image
+
+
+def get_background(plan, tier=FULL, timer=None, seed=None):
+    """Pick a cached background variant, rendering the cache on first use
+
+    With a `seed` (and deterministic mode) the variant is chosen by it.
+    """
+    variants = plan.backgrounds.setdefault(tier, [])
+    while len(variants) < BACKGROUND_VARIANTS:
+        rng = random.Random(f'{tier}:{len(variants)}') if DETERMINISTIC_RENDER else random
+        variants.append(render_background(plan, tier, timer=timer, rng=rng))
+    if DETERMINISTIC_RENDER and seed is not None:
+        background = variants[seed % len(variants)].copy()
+    else:
+        background = random.choice(variants).copy()
+    if timer:
+        timer.lap('background')
+    return background
+
+
+def render_welcome_card(display_name, member_count, avatar, tier=FULL, seed=None, theme=None):
+    """Render the EPIC welcome card and return it as an encoder.EncodedImage.
+
+    Pure and picklable: everything it needs is passed in, so it can run
+    inside a worker process without touching discord or the event loop.
+    `avatar` is a PreparedAvatar from avatar.prepare_avatar (or None). Only the
+    theme's dynamic layers are drawn per join; the static ones come from the
+    background cache. `tier` picks the quality tier (see quality.py); `seed`
+    (the member ID) makes the card reproducible in deterministic mode.
+    """
+    effects = effects_for(tier)
+    timer = StageTimer()
+    plan = plan_for(theme)
+    canvas = Canvas(get_background(plan, tier, timer, seed))
+
+    fields = {'name': display_name, 'NAME': display_name.upper(), 'count': member_count}
+    for stage, effect, draw in plan.dynamic:
+        if effect is None or effect in effects:
+            draw(canvas, effects, avatar, fields)
+        timer.lap(stage)
+
+    return encode_card(canvas, timer)
+
+
+def render_collage(entries, first_number, last_number, tier=FULL, theme=None):
+    """Render one card welcoming several members at once (burst mode)
+
+    `entries` is a list of (display_name, PreparedAvatar or None); avatars are
+    laid out in rows of four over the theme's background, shrinking as rows
+    are added so the grid always stays in the top ~half above the title. The
+    layout is drawn for a 1000x500 card and scaled to the theme's size.
+    """
+    effects = effects_for(tier)
+    timer = StageTimer()
+    plan = plan_for(theme)
+    width, height = plan.width, plan.height
+    canvas = Canvas(get_background(plan, tier, timer))
+
+    # Positions scale with each axis; sizes with the smaller one so nothing overflows
+    def sy(y):
+        return int(y * height / 500)
+    scale = min(width / 1000, height / 500)
+
+    def sized(size):
+        return max(1, int(size * scale))
+
+    # Avatar grid in the top half of the card
+    columns = min(len(entries), 4)
+    rows = (len(entries) + columns - 1) // columns
+    cell = sized(min(150 if rows == 1 else 115, 230 // rows))
+    for i, (_, avatar) in enumerate(entries):
+        row, column = divmod(i, columns)
+        in_row = min(columns, len(entries) - row * columns)
+        x = (width - in_row * cell) // 2 + column * cell
+        y = sy(20) + (sy(240) - rows * cell) // 2 + row * cell
+        sprite = avatar.framed if avatar is not None else ring_border(FRAMED_AVATAR_SIZE)
+        canvas.paste(sprite.resize((cell, cell), Image.Resampling.LANCZOS), (x, y))
+    timer.lap('avatar')
+
+    text_x = width // 2
+
+    draw_rainbow_title(canvas, f"WELCOME {len(entries)} NEW SURFERS!", text_x, sy(280), sized(52),
+                       shadow='title_shadow' in effects)
+
+    # Everyone's name, shortened to fit on one line
+    names = ", ".join(name for name, _ in entries)
+    if len(names) > 64:
+        names = names[:61] + "..."
+    draw_glowing_text(canvas, names, (text_x, sy(360)), sized(22),
+                      fill=(255, 255, 255), glow_color=(0, 255, 255, 160),
+                      glow='subtitle_glow' in effects)
+
+    draw_metallic_text(canvas, f"MEMBERS #{first_number}-#{last_number} HAVE ARRIVED!",
+                       (text_x, sy(420)), sized(20))
+    timer.lap('text')
+
+    return encode_card(canvas, timer)
+
+
+def encode_card(canvas, timer):
+    """Flatten and encode the canvas, attaching the render's stage times"""
+    card = encoder.encode(canvas.to_rgb())
+    timer.lap('encode')
+    card.stages = timer.stages
+    return card
+
+
+def sample_avatar():
+    """A PreparedAvatar from a plain generated image, for trial renders"""
+    data = io.BytesIO()
+    Image.new('RGB', (FRAMED_AVATAR_SIZE, FRAMED_AVATAR_SIZE), (90, 160, 220)).save(data, 'PNG')
+    return prepare_avatar(data.getvalue())
+
+
+def check_theme(theme):
+    """Compile a theme and render a trial background and card with it
+
+    Raises ValueError if any of that fails, so a theme that compiles but
+    can't draw is turned away at load time instead of failing every join.
+    A plan compiled just for the trial isn't kept.
+    """
+    plan = compile_plan(theme)
+    cached = theme.digest in _plans
+    try:
+        render_background(plan, rng=random.Random(0))
+        render_welcome_card(SAMPLE_FIELDS['name'], SAMPLE_FIELDS['count'], sample_avatar(),
+                            FULL, 0, theme)
+    except Exception as e:
+        raise ValueError(f"Theme '{theme.name}' compiles but can't render: {e!r}") from None
+    finally:
+        if not cached:
+            _plans.pop(theme.digest, None)
+
+
+def warm_up():
+    """Pool initializer: pay import and first-render costs before any join"""
+    for tier in TIERS:
+        render_welcome_card("warmup", 0, None, tier)
+
+
+class RenderService:
+    """Runs card renders in a process pool so the event loop never blocks"""
+
+    def __init__(self, workers=RENDER_WORKERS, timeout=RENDER_TIMEOUT):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.pool = None
+        # Joins that find the pool gone wait here so only one restarts it
+        self.start_lock = asyncio.Lock()
+        # Worker processes of pools retired after a timeout, killed after a grace period
+        self.retired = []
+        self.recycles = 0
+
+    async def start(self):
+        """Create the pool and wait until every worker is warmed up"""
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up,
+                                        mp_context=POOL_CONTEXT)
+        loop = asyncio.get_running_loop()
+        # One no-op per worker forces them all to spawn (and run warm_up) now
+        await asyncio.gather(*[loop.run_in_executor(self.pool, os.getpid)
+                               for _ in range(self.workers)])
+        print(f"🎨 Render pool ready with {self.workers} warm workers")
+
+    async def run(self, func, *args):
+        """Run func(*args) in the pool with the per-render timeout"""
+        if self.pool is None:
+            async with self.start_lock:
+                if self.pool is None:
+                    await self.start()
+        pool = self.pool
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(pool, func, *args),
+                                          timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.retire(pool)
+            raise
+        except BrokenProcessPool:
+            # A worker died (OOM, segfault); every render in flight on that pool
+            # lands here, but only the first drops it (never a newer, healthy one)
+            pool.shutdown(wait=False, cancel_futures=True)
+            if self.pool is pool:
+                print("Render pool broken, restarting workers")
+                self.pool = None
+            raise
+
+    def retire(self, pool):
+        """Swap in a fresh pool after a timeout so a stuck render can't hold a slot
+
+        wait_for only abandons the future; the worker keeps rendering. The old
+        pool finishes what it already has, then gets one more timeout before
+        its workers are killed (by then every caller has given up on it).
+        """
+        if self.pool is not pool:
+            return
+        print(f"Render took over {self.timeout}s, recycling the render pool")
+        self.pool = None
+        self.recycles += 1
+        # ProcessPoolExecutor has no public way to reach its workers; _processes
+        # (pid -> Process) is a CPython implementation detail, read before
+        # shutdown() clears it. Without it the old workers just exit on their own.
+        processes = list((getattr(pool, '_processes', None) or {}).values())
+        self.retired.extend(processes)
+        pool.shutdown(wait=False)
+        asyncio.get_running_loop().call_later(self.timeout, self.kill, processes)
+
+    def kill(self, processes):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        self.retired = [process for process in self.retired if process not in processes]
+
+    async def render(self, display_name, member_count, avatar, tier=FULL, seed=None, theme=None):
+        return await self.run(render_welcome_card, display_name, member_count, avatar, tier,
+                              seed, theme)
+
+    async def render_collage(self, entries, first_number, last_number, tier=FULL, theme=None):
+        return await self.run(render_collage, entries, first_number, last_number, tier, theme)
+
+    async def prepare_avatar(self, data):
+        return await self.run(prepare_avatar, data)
+
+    def shutdown(self, wait=False):
+        if self.pool is not None:
+            self.pool.shutdown(wait=wait, cancel_futures=True)
+            self.pool = None
+        self.kill(list(self.retired))
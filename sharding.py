@@ -0,0 +1,111 @@
+import asyncio
+import discord
+import os
+from contextlib import asynccontextmanager
+from render import RENDER_WORKERS
+
+# Sharding. 'off' runs one shard on a plain discord.Client. 'auto' uses
+# discord.AutoShardedClient with Discord's recommended shard count, or with
+# SHARD_COUNT if set. Setting SHARD_IDS (e.g. "0-3" or "4,5,6,7", needs
+# SHARD_COUNT) runs just those shards, so capacity grows by starting more
+# processes, each with its own render pool (and its own PORT).
+SHARDING = os.environ.get('SHARDING', 'off').lower()
+SHARD_COUNT = int(os.environ['SHARD_COUNT']) if os.environ.get('SHARD_COUNT') else None
+SHARD_IDS = os.environ.get('SHARD_IDS', '')
+# Renders each shard may have in flight; 0 splits RENDER_WORKERS evenly
+SHARD_RENDER_SLOTS = int(os.environ.get('SHARD_RENDER_SLOTS', 0))
+
+SHARDING_MODES = ('off', 'auto')
+
+
+def parse_shard_ids(text):
+    """'0-3' / '0,2,4' / '0-1,6' -> sorted list of shard IDs"""
+    ids = set()
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        ids.update(range(int(first), int(last or first) + 1))
+    return sorted(ids)
+
+
+if SHARDING not in SHARDING_MODES:
+    raise ValueError(f"SHARDING must be one of {SHARDING_MODES}, not '{SHARDING}'")
+if SHARD_IDS:
+    SHARDING = 'auto'
+    SHARD_IDS = parse_shard_ids(SHARD_IDS)
+    if SHARD_COUNT is None:
+        raise ValueError("SHARD_IDS needs SHARD_COUNT (the total across all processes)")
+    if SHARD_IDS[-1] >= SHARD_COUNT:
+        raise ValueError(f"SHARD_IDS go up to {SHARD_IDS[-1]} but SHARD_COUNT is {SHARD_COUNT}")
+
+
+def client_class():
+    return discord.AutoShardedClient if SHARDING == 'auto' else discord.Client
+
+
+def shard_options():
+    """Extra client keyword arguments for the configured sharding mode"""
+    options = {}
+    if SHARDING == 'auto':
+        if SHARD_COUNT is not None:
+            options['shard_count'] = SHARD_COUNT
+        if SHARD_IDS:
+            options['shard_ids'] = SHARD_IDS
+    return options
+
+
+def shard_latencies(client):
+    """(shard_id, seconds) for every shard this process runs"""
+    if isinstance(client, discord.AutoShardedClient):
+        return client.latencies
+    return [(0, client.latency)]
+
+
+def shard_for(guild_id, shard_count):
+    """Shard a guild lives on (Discord's formula)"""
+    return (guild_id >> 22) % shard_count if shard_count else 0
+
+
+class ShardSlots:
+    """Render concurrency per shard, so one busy shard can't take the whole pool
+
+    Each shard gets its own semaphore of `per_shard()` slots. Waiters are
+    served in arrival order and every guild queue only has a few workers, so
+    guilds on the same shard take turns instead of a raid hogging it.
+    """
+
+    def __init__(self, local_shards, capacity=RENDER_WORKERS, slots=SHARD_RENDER_SLOTS):
+        # Callable returning how many shards this process runs (known after login)
+        self.local_shards = local_shards
+        self.capacity = capacity
+        self.slots = slots
+        self.semaphores = {}
+        self.active = {}
+        self.waiting = {}
+
+    def per_shard(self):
+        if self.slots > 0:
+            return self.slots
+        return max(1, self.capacity // max(1, self.local_shards()))
+
+    @asynccontextmanager
+    async def slot(self, shard_id):
+        semaphore = self.semaphores.get(shard_id)
+        if semaphore is None:
+            semaphore = self.semaphores[shard_id] = asyncio.Semaphore(self.per_shard())
+            self.active[shard_id] = 0
+            self.waiting[shard_id] = 0
+
+        self.waiting[shard_id] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting[shard_id] -= 1
+        self.active[shard_id] += 1
+        try:
+            yield
+        finally:
+            self.active[shard_id] -= 1
+            semaphore.release()
@@ -0,0 +1,162 @@
+from PIL import Image, ImageDraw, ImageFont, ImageFilter
+from functools import lru_cache
+import colorsys
+import os
+
+# Text rendering for the welcome card. Fonts are loaded once per process,
+# glyphs are rasterized once per (font, size, char), and shadows/glows come
+# from a single blurred mask instead of re-drawing the text many times.
+
+# Font used for all card text; falls back to common system fonts, then to
+# Pillow's bundled default font
+FONT_PATH = os.environ.get('FONT_PATH')
+FONT_CANDIDATES = [
+    FONT_PATH,
+    'arial.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+    '/usr/share/fonts/TTF/DejaVuSans-Bold.ttf',
+    'DejaVuSans-Bold.ttf',
+]
+
+
+@lru_cache(maxsize=None)
+def load_font(size):
+    """First usable font from FONT_CANDIDATES at `size` (cached per process)"""
+    for path in FONT_CANDIDATES:
+        if not path:
+            continue
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    if FONT_PATH:
+        print(f"Font '{FONT_PATH}' could not be loaded, using the default font")
+    return ImageFont.load_default(size)
+
+
+def font_key(font):
+    """Stable identity of a loaded font for cache keys"""
+    return getattr(font, 'path', None) or repr(font)
+
+
+class Glyph:
+    """Rasterized character: coverage mask, its offset from the pen, and the advance"""
+
+    def __init__(self, mask, offset, advance):
+        self.mask = mask
+        self.offset = offset
+        self.advance = advance
+
+
+@lru_cache(maxsize=4096)
+def _glyph(key, size, char):
+    font = load_font(size)
+    left, top, right, bottom = font.getbbox(char)
+    advance = font.getlength(char)
+    if right <= left or bottom <= top:
+        # Whitespace and other invisible characters only move the pen
+        return Glyph(None, (0, 0), advance)
+
+    mask = Image.new('L', (right - left, bottom - top), 0)
+    ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=255)
+    return Glyph(mask, (left, top), advance)
+
+
+def glyph(size, char):
+    """Cached Glyph for `char` in the card font at `size`"""
+    return _glyph(font_key(load_font(size)), size, char)
+
+
+def layout_glyphs(text, size):
+    """Place cached glyphs along a line
+
+    Returns [(glyph, x, y, index)] for every visible character (index is the
+    character's position in `text`) and the total advance of the line.
+    """
+    placed = []
+    pen_x = 0
+    for index, char in enumerate(text):
+        g = glyph(size, char)
+        if g.mask is not None:
+            placed.append((g, pen_x + g.offset[0], g.offset[1], index))
+        pen_x += g.advance
+    return placed, pen_x
+
+
+def line_mask(placed, pad):
+    """Union of the placed glyph masks with `pad` pixels of room on every side"""
+    width = max(int(x) + g.mask.width for g, x, _, _ in placed) + pad * 2
+    height = max(y + g.mask.height for g, _, y, _ in placed) + pad * 2
+    mask = Image.new('L', (width, height), 0)
+    for g, x, y, _ in placed:
+        mask.paste(255, (int(x) + pad, y + pad), g.mask)
+    return mask
+
+
+def soft_mask(mask, radius, gain, limit=255):
+    """One Gaussian blur of `mask`, boosted by `gain` and capped at `limit`"""
+    blurred = mask.filter(ImageFilter.GaussianBlur(radius))
+    return blurred.point(lambda v: min(limit, int(v * gain)))
+
+
+def colored_sprite(mask, color):
+    """RGBA sprite of a single color whose alpha is `mask`"""
+    sprite = Image.new('RGBA', mask.size, color[:3] + (0,))
+    sprite.putalpha(mask)
+    return sprite
+
+
+def draw_rainbow_title(canvas, text, center_x, y, size, shadow=True):
+    """Rainbow-colored title with a soft drop shadow, composed from cached glyphs"""
+    placed, text_width = layout_glyphs(text, size)
+    if not placed:
+        return
+    start_x = int(center_x - text_width // 2)
+
+    # Shadow: the whole line's mask blurred once
+    if shadow:
+        pad = 8
+        sprite = colored_sprite(soft_mask(line_mask(placed, pad), 3, 3), (0, 0, 0))
+        canvas.paste(sprite, (start_x - pad, y - pad))
+
+    # Rainbow characters
+    for g, x, gy, index in placed:
+        hue = (index * 30) % 360
+        rgb = colorsys.hls_to_rgb(hue / 360, 0.7, 1.0)
+        color = tuple(int(c * 255) for c in rgb) + (255,)
+        left, top = start_x + int(x), y + gy
+        canvas.image.paste(color, (left, top, left + g.mask.width, top + g.mask.height), g.mask)
+
+
+@lru_cache(maxsize=64)
+def _glow_text_sprite(key, text, size, fill, glow_color, radius):
+    font = load_font(size)
+    left, top, right, bottom = font.getbbox(text, anchor='mm')
+    pad = radius * 3
+    mask = Image.new('L', (right - left + pad * 2, bottom - top + pad * 2), 0)
+    ImageDraw.Draw(mask).text((pad - left, pad - top), text, font=font, fill=255, anchor='mm')
+
+    # Glow from one blurred copy of the text mask, the text itself on top
+    sprite = colored_sprite(soft_mask(mask, radius, 2.5, glow_color[3]), glow_color)
+    sprite.alpha_composite(colored_sprite(mask, fill))
+    return sprite, (left - pad, top - pad)
+
+
+def draw_glowing_text(canvas, text, center, size, fill, glow_color, radius=5, glow=True):
+    """Text centered on `center` with a soft colored glow (sprite cached per text)"""
+    if not glow:
+        canvas.draw.text(center, text, font=load_font(size), fill=fill, anchor='mm')
+        return
+    sprite, (dx, dy) = _glow_text_sprite(font_key(load_font(size)), text, size,
+                                         fill, glow_color, radius)
+    canvas.paste(sprite, (center[0] + dx, center[1] + dy))
+
+
+def draw_metallic_text(canvas, text, center, size):
+    """Yellow text over a few darker copies for a metallic look"""
+    font = load_font(size)
+    x, y = center
+    for offset_y in range(3):
+        shade = 150 + offset_y * 35
+        canvas.draw.text((x, y + offset_y), text, font=font, fill=(shade, shade, 0), anchor="mm")
+    canvas.draw.text((x, y), text, font=font, fill=(255, 255, 100), anchor="mm")
@@ -0,0 +1,415 @@
+import asyncio
+import hashlib
+import json
+import os
+from functools import lru_cache, partial
+from PIL import Image, ImageDraw
+import generators
+from text import draw_rainbow_title, draw_glowing_text, draw_metallic_text
+
+# Card themes are JSON files in THEME_DIR (themes/<name>.json) listing layers:
+#
+#   "static"  - member-independent layers (gradient, particles, waves, ...),
+#               rasterized once into the cached background variants
+#   "dynamic" - layers drawn for every card (avatar sprites and text, where
+#               text may use {name}, {NAME} and {count})
+#
+# A layer with an "effect" key is only drawn when the quality tier enables
+# that effect; "*_effect" keys gate parts of a layer the same way. A spec is
+# compiled into a RenderPlan once per worker and cached by content digest, so
+# an edited theme gets a fresh plan (and fresh backgrounds) on its next render.
+
+THEME_DIR = os.environ.get('THEME_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'themes'))
+THEME_POLL = float(os.environ.get('THEME_POLL', 10))
+DEFAULT_THEME = 'default'
+
+# Values used to check text templates when a theme is compiled
+SAMPLE_FIELDS = {'name': 'Surfer', 'NAME': 'SURFER', 'count': 1}
+
+# Largest font size a text layer may ask for (FreeType refuses huge ones)
+MAX_TEXT_SIZE = 400
+
+
+class Theme:
+    """A theme spec as loaded from disk; `digest` changes whenever the spec does"""
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.spec = spec
+        self.digest = hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class RenderPlan:
+    """A compiled theme: (stage, effect, draw) steps for the background and the card"""
+
+    def __init__(self, name, digest, width, height, static, dynamic):
+        self.name = name
+        self.digest = digest
+        self.width = width
+        self.height = height
+        self.static = static
+        self.dynamic = dynamic
+        # tier -> rendered background variants, filled by the renderer
+        self.backgrounds = {}
+
+
+def load_theme(path):
+    with open(path) as f:
+        spec = json.load(f)
+    return Theme(os.path.splitext(os.path.basename(path))[0], spec)
+
+
+@lru_cache(maxsize=None)
+def default_theme():
+    return load_theme(os.path.join(THEME_DIR, f'{DEFAULT_THEME}.json'))
+
+
+def gated(layer, key, effects):
+    """True unless the layer names an effect under `key` that the tier leaves out"""
+    effect = layer.get(key)
+    return effect is None or effect in effects
+
+
+def color(value, channels=(3, 4)):
+    """Color tuple with one of `channels` lengths, every channel 0-255"""
+    value = tuple(int(c) for c in value)
+    if len(value) not in channels or not all(0 <= c <= 255 for c in value):
+        allowed = ' or '.join(str(n) for n in channels)
+        raise ValueError(f"Colors need {allowed} values from 0 to 255, not {list(value)}")
+    return value
+
+
+def span(value, low=None, high=None):
+    """(lo, hi) integer range with lo <= hi, optionally inside [low, high]"""
+    lo, hi = (int(v) for v in value)
+    if lo > hi or (low is not None and lo < low) or (high is not None and hi > high):
+        raise ValueError(f"Bad range {list(value)}")
+    return lo, hi
+
+
+def point(value):
+    x, y = (int(v) for v in value)
+    return x, y
+
+
+def at_least(value, minimum, name):
+    if value < minimum:
+        raise ValueError(f"'{name}' must be at least {minimum}, not {value}")
+    return value
+
+
+def between(value, minimum, maximum, name):
+    if not minimum <= value <= maximum:
+        raise ValueError(f"'{name}' must be from {minimum} to {maximum}, not {value}")
+    return value
+
+
+# Static layers: draw(canvas, effects, rng)
+
+def draw_gradient(canvas, effects, rng):
+    # Epic animated-style gradient background (blue to purple, wave influenced)
+    canvas.image.paste(generators.hls_gradient(*canvas.size))
+
+
+def draw_particles(canvas, effects, rng, count, xs, ys, sizes, alphas, opacity, rgb):
+    # Star-like particles / foam, each blended only over its own pixels
+    with canvas.batch() as shapes:
+        for _ in range(count):
+            x = rng.randint(*xs)
+            y = rng.randint(*ys)
+            size = rng.randint(*sizes)
+            alpha = rng.randint(*alphas)
+            shapes.ellipse([x - size, y - size, x + size, y + size],
+                           fill=rgb + (int(alpha * opacity),))
+
+
+def draw_wave_fill(canvas, effects, rng, waves):
+    # Fill everything below each wave line with the (translucent) wave color,
+    # working only on the rows the wave can reach
+    width, height = canvas.size
+    for y_base, amplitude, frequency, fill in waves:
+        top = max(0, y_base - amplitude)
+        if top >= height:
+            continue  # entirely below the canvas
+        mask = generators.wave_mask(width, height - top, y_base - top, amplitude, frequency,
+                                    alpha=fill[3])
+        canvas.image.paste(fill[:3] + (255,), (0, top, width, height), mask)
+
+
+def draw_lightning(canvas, effects, rng, layer, bolts, fill, outline, glow_width):
+    if gated(layer, 'glow_effect', effects):
+        with canvas.batch() as shapes:
+            for bolt in bolts:
+                for thickness in range(glow_width, 0, -1):
+                    alpha = int(50 * (glow_width + 1 - thickness) / glow_width)
+                    shapes.polygon(bolt, outline=fill + (alpha,), width=thickness)
+
+    for bolt in bolts:
+        canvas.draw.polygon(bolt, outline=outline, width=3)
+        canvas.draw.polygon(bolt, fill=fill)
+
+
+def draw_sparkles(canvas, effects, rng, layer, positions, sizes):
+    glow = gated(layer, 'glow_effect', effects)
+    sparkles = []
+    with canvas.batch() as shapes:
+        for x, y in positions:
+            sparkle_size = rng.randint(*sizes)
+
+            # Four-pointed star
+            points = [
+                (x, y - sparkle_size),  # top
+                (x + 3, y - 3),
+                (x + sparkle_size, y),  # right
+                (x + 3, y + 3),
+                (x, y + sparkle_size),  # bottom
+                (x - 3, y + 3),
+                (x - sparkle_size, y),  # left
+                (x - 3, y - 3)
+            ]
+            sparkles.append(points)
+
+            if not glow:
+                continue
+            for glow_size in range(5, 0, -1):
+                glow_alpha = int(80 * (6 - glow_size) / 5)
+                glow_points = [(px + rng.randint(-glow_size, glow_size),
+                               py + rng.randint(-glow_size, glow_size)) for px, py in points]
+                shapes.polygon(glow_points, fill=(255, 255, 255, glow_alpha))
+
+    for points in sparkles:
+        canvas.draw.polygon(points, fill=(255, 255, 255))
+
+
+def draw_wave_overlay(canvas, effects, rng, layer, waves):
+    width, height = canvas.size
+    foam_caps = gated(layer, 'foam_caps_effect', effects)
+    for wave_y, amplitude, frequency, phase, fill in waves:
+        # The layer only spans from just above its crests (foam included) down
+        top = max(0, wave_y - amplitude - 5)
+        if top >= height:
+            continue  # entirely below the canvas
+        overlay = Image.new('RGBA', (width, height - top), fill[:3] + (0,))
+        overlay.putalpha(generators.wave_mask(width, height - top, wave_y - top, amplitude,
+                                              frequency, phase, alpha=fill[3]))
+
+        # Add foam caps where the wave peaks
+        if foam_caps:
+            wave_draw = ImageDraw.Draw(overlay)
+            for x1, y1 in generators.wave_crests(width, wave_y - top, amplitude, frequency, phase):
+                wave_draw.polygon([(x1 - 10, y1 - 5), (x1 + 10, y1 - 5),
+                                   (x1 + 15, y1 + 5), (x1 - 15, y1 + 5)],
+                                  fill=(255, 255, 255, 200))
+
+        canvas.composite_shape(overlay, (0, top, width, height))
+
+
+def compile_particles(layer, width, height):
+    opacity = float(layer.get('opacity', 1.0))
+    if not 0 <= opacity <= 1:
+        raise ValueError(f"'opacity' must be between 0 and 1, not {opacity}")
+    return partial(draw_particles, count=at_least(int(layer.get('count', 50)), 0, 'count'),
+                   xs=span(layer.get('x', (0, width))), ys=span(layer.get('y', (0, height))),
+                   sizes=span(layer['size'], low=0), alphas=span(layer['alpha'], 0, 255),
+                   opacity=opacity, rgb=color(layer.get('color', (255, 255, 255)), (3,)))
+
+
+def compile_wave_fill(layer, width, height):
+    return partial(draw_wave_fill, waves=[
+        (int(w['y']), int(w['amplitude']), float(w['frequency']), color(w['color'], (4,)))
+        for w in layer['waves']])
+
+
+def bolt(value):
+    points = [point(p) for p in value]
+    if len(points) < 2:
+        raise ValueError(f"A bolt needs at least 2 points, not {value!r}")
+    return points
+
+
+def compile_lightning(layer, width, height):
+    return partial(draw_lightning, layer=layer,
+                   bolts=[bolt(b) for b in layer['bolts']],
+                   fill=color(layer.get('color', (255, 255, 0)), (3,)),
+                   outline=color(layer.get('outline', (255, 255, 255))),
+                   glow_width=at_least(int(layer.get('glow_width', 8)), 1, 'glow_width'))
+
+
+def compile_sparkles(layer, width, height):
+    return partial(draw_sparkles, layer=layer,
+                   positions=[point(p) for p in layer['positions']],
+                   sizes=span(layer['size'], low=0))
+
+
+def compile_wave_overlay(layer, width, height):
+    return partial(draw_wave_overlay, layer=layer, waves=[
+        (int(w['y']), int(w['amplitude']), float(w['frequency']), float(w.get('phase', 0)),
+         color(w['color'], (4,)))
+        for w in layer['waves']])
+
+
+STATIC_LAYERS = {
+    'gradient': lambda layer, width, height: draw_gradient,
+    'particles': compile_particles,
+    'wave_fill': compile_wave_fill,
+    'lightning': compile_lightning,
+    'sparkles': compile_sparkles,
+    'wave_overlay': compile_wave_overlay,
+}
+
+
+# Dynamic layers: draw(canvas, effects, avatar, fields)
+
+def draw_avatar(canvas, effects, avatar, fields, sprite, x, y):
+    if avatar is None:
+        return
+    image = getattr(avatar, sprite)
+    left = x - image.width // 2 if x is not None else (canvas.size[0] - image.width) // 2
+    canvas.paste(image, (left, y))
+
+
+def draw_rainbow_text(canvas, effects, avatar, fields, layer, template, x, y, size):
+    draw_rainbow_title(canvas, template.format(**fields), x, y, size,
+                       shadow=gated(layer, 'shadow_effect', effects))
+
+
+def draw_glow_text(canvas, effects, avatar, fields, layer, template, x, y, size, fill, glow_color, radius):
+    draw_glowing_text(canvas, template.format(**fields), (x, y), size, fill=fill,
+                      glow_color=glow_color, radius=radius,
+                      glow=gated(layer, 'glow_effect', effects))
+
+
+def draw_metallic(canvas, effects, avatar, fields, layer, template, x, y, size):
+    draw_metallic_text(canvas, template.format(**fields), (x, y), size)
+
+
+def template(layer):
+    text = layer['text']
+    if not isinstance(text, str):
+        raise ValueError(f"'text' must be a string, not {text!r}")
+    try:
+        text.format(**SAMPLE_FIELDS)
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"Bad text template {text!r}: {e!r}") from None
+    return text
+
+
+def compile_avatar(layer, width, height):
+    sprite = layer.get('sprite', 'framed')
+    if sprite not in ('glow', 'framed'):
+        raise ValueError(f"Avatar sprite must be 'glow' or 'framed', not '{sprite}'")
+    x = int(layer['x']) if 'x' in layer else None
+    return partial(draw_avatar, sprite=sprite, x=x, y=int(layer['y']))
+
+
+def compile_text(draw, layer, width, height, **extra):
+    return partial(draw, layer=layer, template=template(layer), x=int(layer.get('x', width // 2)),
+                   y=int(layer['y']), size=between(int(layer['size']), 1, MAX_TEXT_SIZE, 'size'),
+                   **extra)
+
+
+DYNAMIC_LAYERS = {
+    'avatar': compile_avatar,
+    'rainbow_text': lambda layer, width, height: compile_text(
+        draw_rainbow_text, layer, width, height),
+    'glow_text': lambda layer, width, height: compile_text(
+        draw_glow_text, layer, width, height,
+        fill=color(layer.get('fill', (255, 255, 255))),
+        glow_color=color(layer.get('glow_color', (0, 255, 255, 160)), (4,)),
+        radius=at_least(int(layer.get('radius', 5)), 0, 'radius')),
+    'metallic_text': lambda layer, width, height: compile_text(draw_metallic, layer, width, height),
+}
+
+
+def compile_layers(layers, kinds, width, height, stage):
+    steps = []
+    if not isinstance(layers, list):
+        raise ValueError(f"Layers must be a list, not {layers!r}")
+    for layer in layers:
+        if not isinstance(layer, dict):
+            raise ValueError(f"Layers must be objects, not {layer!r}")
+        kind = layer.get('type')
+        if kind not in kinds:
+            raise ValueError(f"Unknown layer type '{kind}' (expected one of {sorted(kinds)})")
+        steps.append((stage(kind), layer.get('effect'), kinds[kind](layer, width, height)))
+    return steps
+
+
+def compile_plan(theme):
+    """Turn a Theme into a RenderPlan; raises ValueError for a bad spec
+
+    Missing keys, wrong shapes, color lengths, empty ranges and out-of-range
+    sizes are checked here; ThemeStore also trial-renders a theme before
+    using it, for whatever only shows up once drawing.
+    """
+    spec = theme.spec
+    if not isinstance(spec, dict):
+        raise ValueError(f"Invalid theme '{theme.name}': the spec must be a JSON object")
+    try:
+        width, height = (at_least(int(v), 1, 'size') for v in spec.get('size', (1000, 500)))
+        static = compile_layers(spec.get('static', []), STATIC_LAYERS, width, height,
+                                lambda kind: kind)
+        dynamic = compile_layers(spec.get('dynamic', []), DYNAMIC_LAYERS, width, height,
+                                 lambda kind: 'avatar' if kind == 'avatar' else 'text')
+    except (KeyError, TypeError, IndexError, AttributeError, ValueError) as e:
+        raise ValueError(f"Invalid theme '{theme.name}': {e!r}") from None
+    return RenderPlan(theme.name, theme.digest, width, height, static, dynamic)
+
+
+class ThemeStore:
+    """Themes from THEME_DIR by name, reloaded when their files change
+
+    Only valid themes replace what is loaded: each one has to compile and
+    render a trial card first. An unknown name falls back to the default theme.
+    """
+
+    def __init__(self, directory=THEME_DIR, poll_interval=THEME_POLL):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.themes = {}
+        self.mtimes = {}
+        self.task = None
+
+    def get(self, name):
+        return self.themes.get(name) or self.themes.get(DEFAULT_THEME)
+
+    def load(self):
+        # render imports this module, so import it here
+        from render import check_theme
+        try:
+            names = sorted(entry.name for entry in os.scandir(self.directory)
+                           if entry.name.endswith('.json'))
+        except FileNotFoundError:
+            names = []
+        for filename in names:
+            path = os.path.join(self.directory, filename)
+            try:
+                mtime = os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            if self.mtimes.get(filename) == mtime:
+                continue
+            self.mtimes[filename] = mtime
+            try:
+                theme = load_theme(path)
+                check_theme(theme)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Ignoring invalid theme '{filename}': {e}")
+                continue
+            self.themes[theme.name] = theme
+            print(f"🎨 Loaded theme '{theme.name}' ({theme.digest})")
+
+    def start(self):
+        self.load()
+        if self.task is None and self.poll_interval > 0:
+            self.task = asyncio.create_task(self.watch())
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            self.load()
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
@@ -0,0 +1,52 @@
+import os
+from aiohttp import web
+from metrics import metrics
+
+# Keep-alive / health web server. It runs on the bot's own event loop, so
+# there is no second server stack or thread competing with the bot.
+
+PORT = int(os.environ.get('PORT', 5000))
+
+
+async def home(request):
+    return web.Response(text="🌊 Epic Welcome Bot is ONLINE! 🌊")
+
+
+async def prometheus_metrics(request):
+    return web.Response(text=metrics.render(),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+def create_app(health):
+    """Web app with /, /healthz and /metrics; `health()` returns the /healthz dict"""
+
+    async def healthz(request):
+        status = health()
+        return web.json_response(status, status=200 if status.get('ok') else 503)
+
+    app = web.Application()
+    app.router.add_get('/', home)
+    app.router.add_get('/healthz', healthz)
+    app.router.add_get('/metrics', prometheus_metrics)
+    return app
+
+
+class WebServer:
+    """Starts and stops the aiohttp app on the running event loop"""
+
+    def __init__(self, health, host='0.0.0.0', port=PORT):
+        self.app = create_app(health)
+        self.host = host
+        self.port = port
+        self.runner = None
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        print(f"🌐 Web server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None